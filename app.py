@@ -6,6 +6,7 @@ from materials import materials_bp
 import os
 import logging
 import threading
+import click
 import time
 from services.backup_manager import create_backup
 from werkzeug.utils import secure_filename
@@ -48,6 +49,10 @@ def create_app(config_name='default'):
     migrate.init_app(app, db)
     mail.init_app(app)
 
+    # Templates pick passport thumbnails with get_passport_url(worker, 'list')
+    from utils import get_passport_url
+    app.jinja_env.globals['get_passport_url'] = get_passport_url
+
     logging.basicConfig(level=logging.INFO)
 
     # =========================
@@ -179,11 +184,54 @@ def create_app(config_name='default'):
     #     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
     # Keeping commented code to maintain structure and line count
 
+    # =========================
+    # CLI COMMANDS
+    # =========================
+    @app.cli.command('rebuild-attendance-monthly')
+    @click.option('--month', default=None, help='Only rebuild this YYYY-MM month.')
+    def rebuild_attendance_monthly_command(month):
+        """Recompute the attendance_monthly rollup from raw attendance."""
+        from services.attendance_monthly import rebuild_attendance_monthly
+        months = rebuild_attendance_monthly(month)
+        db.session.commit()
+        click.echo(f"Rebuilt attendance_monthly for {months} month(s).")
+
+    @app.cli.command('compact-attendance')
+    @click.option('--month', default=None, help='Compact this YYYY-MM month even if its payroll is not locked.')
+    def compact_attendance_command(month):
+        """Pack closed months of attendance into the compact archive."""
+        from services.attendance_archive import compact_month, compact_closed_months
+        if month:
+            compact_month(month)
+            db.session.commit()
+            months = [month]
+        else:
+            months = compact_closed_months()
+        click.echo(f"Compacted {len(months)} month(s): {', '.join(months) or 'none'}.")
+
+    @app.cli.command('retry-passport-uploads')
+    def retry_passport_uploads_command():
+        """Queue staged passports that are pending or whose upload failed, and wait for them."""
+        from services.passport_upload import resume_pending_uploads, wait_for_uploads
+        queued = resume_pending_uploads(app, include_failed=True)
+        wait_for_uploads()
+        click.echo(f"Retried {queued} passport upload(s).")
+
+    # =========================
+    # PASSPORT UPLOAD QUEUE
+    # =========================
+    # Staged passports left pending by a restart are picked up again by the web server
+    # only: flask CLI commands other than `run` (retry-passport-uploads resumes its own) skip it
+    import sys
+    cli_command = click.get_current_context(silent=True) is not None and 'run' not in sys.argv
+    if app.config['PASSPORT_RESUME_ON_START'] and not cli_command:
+        from services.passport_upload import resume_pending_uploads
+        threading.Thread(target=resume_pending_uploads, args=(app,), daemon=True).start()
+
     # =========================
     # AUTO BACKUP LOOP
     # =========================
     # Don't start backup during migrations or on Render
-    import sys
     if os.environ.get("RENDER") != "true" and 'db' not in sys.argv:
         threading.Thread(target=auto_backup_loop, args=(app,), daemon=True).start()
 
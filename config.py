@@ -7,6 +7,9 @@ class Config:
     DEBUG = False
     PROPAGATE_EXCEPTIONS = True
     MAX_CONTENT_LENGTH = 5 * 1024 * 1024 # 5MB upload limit
+    ATTENDANCE_IMPORT_MAX_BYTES = 64 * 1024 * 1024 # a year of clock exports for the whole staff
+    # Pack attendance of payroll-locked months into attendance_archive when a period is locked
+    ATTENDANCE_COMPACTION = os.environ.get('ATTENDANCE_COMPACTION', 'false').lower() == 'true'
 
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SECURE = False
@@ -23,6 +26,20 @@ class Config:
     UPLOAD_FOLDER = 'static/uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+    # Passports are staged on local disk and uploaded in the background
+    PASSPORT_BACKEND = os.environ.get('PASSPORT_BACKEND', 'cloudinary')  # cloudinary / local
+    PASSPORT_STAGING_DIR = os.environ.get('PASSPORT_STAGING_DIR')  # default: <instance>/passport_staging
+    PASSPORT_LOCAL_DIR = 'static/uploads/passports'  # where the local backend stores files
+    PASSPORT_UPLOAD_CONCURRENCY = int(os.environ.get('PASSPORT_UPLOAD_CONCURRENCY', 2))
+    PASSPORT_UPLOAD_RETRIES = int(os.environ.get('PASSPORT_UPLOAD_RETRIES', 3))
+    # A claimed upload not finished within this long is taken to have died with its process
+    PASSPORT_UPLOAD_CLAIM_SECONDS = int(os.environ.get('PASSPORT_UPLOAD_CLAIM_SECONDS', 600))
+    # The web server picks up uploads left pending by a restart; off for tests and scripts
+    PASSPORT_RESUME_ON_START = os.environ.get('PASSPORT_RESUME_ON_START', 'true').lower() == 'true'
+
+    # Rendered ID-card QR codes, kept on disk so restarts and other workers reuse them
+    QR_CACHE_DIR = os.environ.get('QR_CACHE_DIR')  # default: <instance>/qr_cache
+
     COMPANY_LOGO_URL = os.environ.get(
         'COMPANY_LOGO_URL', 
         'https://res.cloudinary.com/dnaucqn8z/image/upload/v1780323719/logo_uigcps.jpg'
@@ -0,0 +1,35 @@
+"""one active payroll run per period
+
+Revision ID: 7d3f9a2b5e16
+Revises: 6b2e8d4a1c95
+Create Date: 2026-10-19 11:04:17.839502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3f9a2b5e16'
+down_revision = '6b2e8d4a1c95'
+branch_labels = None
+depends_on = None
+
+ACTIVE = "status IN ('queued', 'running')"
+
+
+def upgrade():
+    # Older active duplicates would block the index; only the newest one per period is kept live
+    op.execute(f"""
+        UPDATE payroll_runs SET status = 'failed', error = 'Superseded by a newer run'
+        WHERE {ACTIVE}
+          AND id NOT IN (SELECT max(id) FROM payroll_runs WHERE {ACTIVE} GROUP BY month)
+    """)
+    with op.batch_alter_table('payroll_runs', schema=None) as batch_op:
+        batch_op.create_index('uq_payroll_runs_active_month', ['month'], unique=True,
+                              postgresql_where=sa.text(ACTIVE), sqlite_where=sa.text(ACTIVE))
+
+
+def downgrade():
+    with op.batch_alter_table('payroll_runs', schema=None) as batch_op:
+        batch_op.drop_index('uq_payroll_runs_active_month')
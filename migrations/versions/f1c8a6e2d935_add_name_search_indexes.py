@@ -0,0 +1,63 @@
+"""add trigram name search indexes
+
+Revision ID: f1c8a6e2d935
+Revises: e7b3d9a0c416
+Create Date: 2026-10-17 20:05:41.662019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8a6e2d935'
+down_revision = 'e7b3d9a0c416'
+branch_labels = None
+depends_on = None
+
+# (table, FTS5 table) pairs; each indexes the table's "name" column
+SEARCH_TABLES = [('workers', 'workers_fts'), ('materials', 'materials_fts')]
+
+
+def _sqlite_statements(table, fts):
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5(name, content='{table}', content_rowid='id', tokenize='trigram')",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        f"""CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END""",
+        f"""CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+        END""",
+        f"""CREATE TRIGGER {fts}_au AFTER UPDATE OF name ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END""",
+    ]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table, _ in SEARCH_TABLES:
+            op.create_index(f'ix_{table}_name_trgm', table, ['name'], unique=False,
+                            postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for table, fts in SEARCH_TABLES:
+            for statement in _sqlite_statements(table, fts):
+                op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        for table, _ in SEARCH_TABLES:
+            op.drop_index(f'ix_{table}_name_trgm', table_name=table)
+    elif dialect == 'sqlite':
+        for _, fts in SEARCH_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                op.execute(f"DROP TRIGGER IF EXISTS {fts}_{suffix}")
+            op.execute(f"DROP TABLE IF EXISTS {fts}")
@@ -9,7 +9,7 @@ class Worker(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     worker_code = db.Column(db.String(20), unique=True, nullable=True)
     name = db.Column(db.String(100), nullable=False)
-    phone_number = db.Column(db.String(20), nullable=False)
+    phone_number = db.Column(db.String(20), nullable=False, index=True)
     date_of_birth = db.Column(db.Date, nullable=False)
     gender = db.Column(db.String(10), nullable=False)
     qualifications = db.Column(db.String(100), nullable=False)
@@ -34,6 +34,11 @@ class Worker(db.Model):
     guarantor = db.Column(db.String(100), nullable=False)
     
     passport = db.Column(db.String(255), nullable=True)
+    # 'pending' while a staged upload waits for the background uploader, 'uploading' once one
+    # has claimed it (at passport_claimed_at), 'failed' after its retries
+    passport_status = db.Column(db.String(10), nullable=True)
+    passport_staged = db.Column(db.String(255), nullable=True)
+    passport_claimed_at = db.Column(db.DateTime, nullable=True)
     department = db.Column(db.String(50), nullable=True)
 
     updated_at = db.Column(
@@ -52,6 +57,14 @@ class Worker(db.Model):
     last_action_date = db.Column(db.DateTime, nullable=True)
     notes = db.Column(db.Text, nullable=True)
 
+    # How closely the worker matched a search, loaded by the workers list with with_expression()
+    search_rank = db.query_expression()
+
+    __table_args__ = (
+        # Serves the case-insensitive exact position match in the workers search
+        db.Index('ix_workers_position_lower', func.lower(position)),
+    )
+
     attendance_records = db.relationship(
         'Attendance',
         back_populates='worker',  # <-- YOU MISSED THIS LINE
@@ -79,12 +92,22 @@ class Worker(db.Model):
         return f'<Worker {self.worker_code} - {self.name}>'
 
     def get_month_attendance(self, month_str):
-        year, month = map(int, month_str.split('-'))
-        return self.attendance_records.filter(
-            func.extract('year', Attendance.date) == year,
-            func.extract('month', Attendance.date) == month,
-            Attendance.status.in_(['present', 'Present', 'P'])
-        ).count()
+        """Present days in a YYYY-MM month, from the attendance_monthly rollup."""
+        present = db.session.query(AttendanceMonthly.present).filter_by(
+            worker_id=self.id,
+            month=month_str
+        ).scalar()
+        return present or 0
+
+class WorkerCodeCounter(db.Model):
+    """Last worker code number handed out, for databases without sequences (SQLite)."""
+    __tablename__ = 'worker_code_counter'
+
+    name = db.Column(db.String(30), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<WorkerCodeCounter {self.name}={self.value}>'
 
 class EmailLog(db.Model):
     __tablename__ = 'email_logs'
@@ -167,6 +190,8 @@ class Attendance(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint('worker_id', 'date', name='_worker_date_uc'),
+        # Covers per-worker date-range scans that also test status, without touching the table
+        db.Index('ix_attendance_worker_date_status', 'worker_id', 'date', 'status'),
     )
 
     def __repr__(self):
@@ -186,6 +211,91 @@ class Attendance(db.Model):
             return round(hours, 2)
         return None
 
+class AttendanceMonth(db.Model):
+    """One row per YYYY-MM that has attendance; backs the history month dropdown."""
+    __tablename__ = 'attendance_months'
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False, unique=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    def __repr__(self):
+        return f'<AttendanceMonth {self.month}>'
+
+class AttendanceMonthly(db.Model):
+    """Per-worker monthly attendance rollup, kept in step with every attendance write."""
+    __tablename__ = 'attendance_monthly'
+
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(
+        db.Integer,
+        db.ForeignKey('workers.id', ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    present = db.Column(db.Integer, nullable=False, default=0)
+    absent = db.Column(db.Integer, nullable=False, default=0)
+    late = db.Column(db.Integer, nullable=False, default=0)
+    leave = db.Column(db.Integer, nullable=False, default=0)
+    total_hours = db.Column(db.Float, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('worker_id', 'month', name='uq_attendance_monthly_worker_month'),
+    )
+
+    def __repr__(self):
+        return f'<AttendanceMonthly {self.worker_id} - {self.month}>'
+
+class AttendanceArchive(db.Model):
+    """
+    Compacted attendance for one worker in a closed month. Bit n of each
+    *_days bitmap is day n+1; times are packed seconds since midnight and
+    change times packed microseconds since the epoch, one slot per day. Replaces that worker's attendance rows for the month.
+    """
+    __tablename__ = 'attendance_archive'
+
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(
+        db.Integer,
+        db.ForeignKey('workers.id', ondelete="CASCADE"),
+        nullable=False,
+        index=True
+    )
+    month = db.Column(db.String(7), nullable=False, index=True)  # YYYY-MM
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    absent_days = db.Column(db.Integer, nullable=False, default=0)
+    late_days = db.Column(db.Integer, nullable=False, default=0)
+    leave_days = db.Column(db.Integer, nullable=False, default=0)
+    times_in = db.Column(db.LargeBinary, nullable=False)
+    times_out = db.Column(db.LargeBinary, nullable=False)
+    updated_times = db.Column(db.LargeBinary, nullable=True)  # per-day updated_at, microseconds since the epoch
+    notes = db.Column(db.Text, nullable=True)  # JSON {day: note}, only days with notes
+    updated_at = db.Column(db.DateTime, nullable=True)  # latest change among the compacted rows
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (
+        db.UniqueConstraint('worker_id', 'month', name='uq_attendance_archive_worker_month'),
+    )
+
+    def __repr__(self):
+        return f'<AttendanceArchive {self.worker_id} - {self.month}>'
+
+class AttendanceSyncKey(db.Model):
+    """Idempotency keys of attendance changes already applied by the sync API."""
+    __tablename__ = 'attendance_sync_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(64), nullable=False, unique=True)
+    worker_id = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    result = db.Column(db.String(10), nullable=False)  # applied / stale
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<AttendanceSyncKey {self.key} - {self.result}>'
+
 class Salary(db.Model):
     __tablename__ = 'salary'
 
@@ -236,16 +346,22 @@ class Salary(db.Model):
         self.amount = self.net_salary
         return self
 
+    @staticmethod
+    def rate_for_worker(daily_rate, amount_of_salary):
+        # The worker's own daily rate, else a 30-day split of the monthly salary. Payroll
+        # generation always paid this: the amount / days_in_month rate it first set on new
+        # rows was overwritten by auto_fill_from_worker() before calculate() ran.
+        if daily_rate and float(daily_rate) > 0:
+            return float(daily_rate)
+        if amount_of_salary and float(amount_of_salary) > 0:
+            return float(amount_of_salary) / 30.0
+        return 0.0
+
     def auto_fill_from_worker(self):
         if not self.worker:
             return self
             
-        if self.worker.daily_rate and float(self.worker.daily_rate) > 0:
-            self.daily_rate = float(self.worker.daily_rate)
-        elif self.worker.amount_of_salary and float(self.worker.amount_of_salary) > 0:
-            self.daily_rate = float(self.worker.amount_of_salary) / 30.0
-        else:
-            self.daily_rate = 0.0
+        self.daily_rate = Salary.rate_for_worker(self.worker.daily_rate, self.worker.amount_of_salary)
             
         self.bank_name = self.worker.bank_name
         self.bank_account = self.worker.bank_account
@@ -267,6 +383,106 @@ class PayrollLock(db.Model):
     def __repr__(self):
         return f'<PayrollLock {self.month}>'
 
+class PayrollPeriodSummary(db.Model):
+    __tablename__ = 'payroll_period_summary'
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False, index=True)
+    department = db.Column(db.String(50), nullable=False, default='')
+    is_processed = db.Column(db.Boolean, nullable=False, default=False)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    total_gross = db.Column(db.Float, nullable=False, default=0.0)
+    total_deductions = db.Column(db.Float, nullable=False, default=0.0)
+    total_net = db.Column(db.Float, nullable=False, default=0.0)
+    refreshed_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('month', 'department', 'is_processed', name='uq_payroll_summary_key'),
+    )
+
+    def __repr__(self):
+        return f'<PayrollPeriodSummary {self.month} {self.department or "-"} processed={self.is_processed}>'
+
+class PayrollSnapshot(db.Model):
+    __tablename__ = 'payroll_snapshots'
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), unique=True, nullable=False)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    checksum = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.LargeBinary, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<PayrollSnapshot {self.month} v{self.version} ({self.row_count} rows)>'
+
+class PayrollDirty(db.Model):
+    __tablename__ = 'payroll_dirty'
+
+    id = db.Column(db.Integer, primary_key=True)
+    worker_id = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.String(7), nullable=False)
+    marked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('worker_id', 'month', name='uq_payroll_dirty_worker_month'),
+    )
+
+    def __repr__(self):
+        return f'<PayrollDirty {self.worker_id} - {self.month}>'
+
+class PayrollRun(db.Model):
+    __tablename__ = 'payroll_runs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.String(7), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # generate, process, update
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    options = db.Column(db.Text, nullable=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    affected = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    requested_by = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 100.0 if self.status == 'completed' else 0.0
+        return round((self.processed / self.total) * 100, 1)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'month': self.month,
+            'kind': self.kind,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'affected': self.affected,
+            'progress': self.progress,
+            'error': self.error,
+            'requested_by': self.requested_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    __table_args__ = (
+        # At most one queued/running run per period, enforced by the database
+        db.Index('uq_payroll_runs_active_month', 'month', unique=True,
+                 postgresql_where=db.text("status IN ('queued', 'running')"),
+                 sqlite_where=db.text("status IN ('queued', 'running')")),
+    )
+
+    def __repr__(self):
+        return f'<PayrollRun {self.id} {self.kind} {self.month} - {self.status}>'
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_log'
 
@@ -282,8 +498,33 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
+    # Structured context so lookups use indexes instead of LIKE scans on details
+    period = db.Column(db.String(7), nullable=True)       # YYYY-MM the entry belongs to
+    entity_key = db.Column(db.String(60), nullable=True)  # e.g. "salary:42", "worker:7"
+
     worker = db.relationship('Worker', backref='audit_logs')
 
+    __table_args__ = (
+        db.Index('ix_audit_log_period_created', 'period', 'created_at', 'id'),
+        db.Index('ix_audit_log_entity_created', 'entity_key', 'created_at', 'id'),
+        db.Index('ix_audit_log_worker_created', 'worker_id', 'created_at', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_name': self.user_name,
+            'action': self.action,
+            'table_name': self.table_name,
+            'record_id': self.record_id,
+            'worker_id': self.worker_id,
+            'worker_name': self.worker_name,
+            'details': self.details,
+            'period': self.period,
+            'entity_key': self.entity_key,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
     def __repr__(self):
         return f'<AuditLog {self.action} - {self.table_name} - {self.record_id}>'
 
@@ -1,13 +1,26 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from extensions import db
 from models import Worker, Attendance
-from utils import login_required
-from datetime import date, datetime
-from sqlalchemy import extract
+from utils import login_required, decode_cursor, keyset_paginate, keyset_paginate_rows
+from services.payroll_dirty import mark_dirty, schedule_recompute
+from services.search import name_match
+from services.attendance_queries import canonical_status, label_to_period, in_month, month_bounds
+from services.attendance_report import hours_report, ReportError
+from services.attendance_stats import day_statistics, day_statistics_etag
+from services.attendance_import import import_attendance, AttendanceImportError
+from services.attendance_archive import month_is_compacted, archived_days
+from services.attendance_monthly import refresh_attendance_monthly, month_totals
+from services.attendance_sync import apply_attendance_sync, SyncError
+from services.attendance import bulk_save_attendance, note_attendance_months, prune_attendance_months, available_months
+from collections import Counter
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
 import logging
 
 attendance_bp = Blueprint('attendance', __name__)
 
+HISTORY_FILTERS = ('month', 'date_from', 'date_to', 'status', 'worker')
+
 @attendance_bp.route('/secretary_attendance', methods=['GET', 'POST'])
 def secretary_attendance():
     return redirect(url_for('attendance.attendance'))
@@ -52,60 +65,33 @@ def attendance():
             try:
                 import json
                 records = json.loads(bulk_data)
-                saved = 0
-                updated = 0
-                errors = 0
-
-                for item in records:
-                    try:
-                        worker_id = int(item.get('worker_id'))
-                        status = item.get('status')
-
-                        if not worker_id or not status:
-                            continue
-
-                        # Parse time fields
-                        time_in = None
-                        time_out = None
-                        if item.get('time_in'):
-                            time_in = datetime.strptime(item['time_in'], '%H:%M').time()
-                        if item.get('time_out'):
-                            time_out = datetime.strptime(item['time_out'], '%H:%M').time()
-
-                        notes = item.get('notes', '').strip()[:100]
-
-                        existing = Attendance.query.filter_by(worker_id=worker_id, date=today).first()
-
-                        if existing:
-                            existing.status = status
-                            existing.time_in = time_in
-                            existing.time_out = time_out
-                            existing.notes = notes
-                            updated += 1
-                        else:
-                            new_att = Attendance(
-                                worker_id=worker_id,
-                                status=status,
-                                date=today,
-                                time_in=time_in,
-                                time_out=time_out,
-                                notes=notes
-                            )
-                            db.session.add(new_att)
-                            saved += 1
-
-                    except Exception as e:
-                        logging.error(f"Bulk save error for worker {item.get('worker_id')}: {e}")
-                        errors += 1
-                        continue
+                if not isinstance(records, list):
+                    raise ValueError("bulk_data must be a list of records")
 
+                outcome = bulk_save_attendance(records, today)
+                mark_dirty((r['worker_id'], r['date']) for r in outcome['rows'])
                 db.session.commit()
+                schedule_recompute(current_app._get_current_object())
+
+                saved, updated, errors = outcome['saved'], outcome['updated'], outcome['failed']
+
+                if request.accept_mimetypes.best == 'application/json':
+                    return jsonify({
+                        'success': errors == 0,
+                        'saved': saved,
+                        'updated': updated,
+                        'superseded': outcome['superseded'],
+                        'failed': errors,
+                        'results': outcome['results']
+                    })
 
                 msg_parts = []
                 if saved > 0:
                     msg_parts.append(f"{saved} new records saved")
                 if updated > 0:
                     msg_parts.append(f"{updated} records updated")
+                if outcome['superseded'] > 0:
+                    msg_parts.append(f"{outcome['superseded']} superseded by a later entry")
                 if errors > 0:
                     msg_parts.append(f"{errors} failed")
 
@@ -136,6 +122,12 @@ def attendance():
                 flash("Invalid worker ID.", "error")
                 return redirect(url_for('attendance.attendance'))
 
+            try:
+                status = canonical_status(status)
+            except ValueError:
+                flash("Invalid attendance status.", "error")
+                return redirect(url_for('attendance.attendance'))
+
             worker = Worker.query.get(worker_id)
             if not worker:
                 flash("Worker not found.", "error")
@@ -172,9 +164,14 @@ def attendance():
                         notes=notes
                     )
                     db.session.add(new_attendance)
+                    note_attendance_months([today])
                     flash(f"Attendance marked for {worker.name}.", "success")
 
+                db.session.flush()
+                refresh_attendance_monthly([(worker_id, today)])
+                mark_dirty([(worker_id, today)])
                 db.session.commit()
+                schedule_recompute(current_app._get_current_object())
 
             except Exception as e:
                 db.session.rollback()
@@ -183,12 +180,13 @@ def attendance():
 
             return redirect(url_for('attendance.attendance'))
 
-    # Calculate stats for template
+    # Calculate stats for template from the rows already loaded above
+    totals = Counter(w.today_status for w in workers)
     total_workers = len(workers)
-    today_present_count = sum(1 for w in workers if getattr(w, 'today_status', None) == 'Present')
-    today_absent_count = sum(1 for w in workers if getattr(w, 'today_status', None) == 'Absent')
-    today_late_count = sum(1 for w in workers if getattr(w, 'today_status', None) == 'Late')
-    today_leave_count = sum(1 for w in workers if getattr(w, 'today_status', None) == 'Leave')
+    today_present_count = totals['Present']
+    today_absent_count = totals['Absent']
+    today_late_count = totals['Late']
+    today_leave_count = totals['Leave']
 
     return render_template(
         'attendance.html',
@@ -210,30 +208,39 @@ def attendance_history():
         flash("Please login first.", "warning")
         return redirect(url_for('auth.login'))
 
-    # Get filter parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 50, type=int)
-    selected_month = request.args.get('month')
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    status = request.args.get('status')
-    worker_search = request.args.get('worker')
+    # A cursor token carries the filters of the listing it came from
+    state = decode_cursor(request.args.get('cursor'))
+    if state and isinstance(state.get('f'), dict):
+        filters = state['f']
+    else:
+        state = None
+        filters = {key: request.args.get(key, '') for key in HISTORY_FILTERS}
+        filters['per_page'] = request.args.get('per_page', 50, type=int)
+
+    try:
+        per_page = max(1, min(int(filters.get('per_page') or 50), 200))
+    except (TypeError, ValueError):
+        per_page = 50
+    selected_month = filters.get('month')
+    date_from = filters.get('date_from')
+    date_to = filters.get('date_to')
+    status = filters.get('status')
+    worker_search = filters.get('worker')
 
     # Base query
-    attendance_query = Attendance.query.join(Worker).order_by(Attendance.date.desc(), Attendance.id.desc())
+    attendance_query = Attendance.query.join(Worker)
 
     # Apply month filter
+    period = None
     if selected_month:
         try:
-            month_dt = datetime.strptime(selected_month, "%B %Y")
-            attendance_query = attendance_query.filter(
-                extract('month', Attendance.date) == month_dt.month,
-                extract('year', Attendance.date) == month_dt.year
-            )
+            period = label_to_period(selected_month)
+            attendance_query = attendance_query.filter(in_month(period))
         except ValueError:
             flash("Invalid month format for filtering.", "error")
 
     # Apply date range filters
+    date_from_obj = date_to_obj = status_value = None
     if date_from:
         try:
             date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
@@ -250,30 +257,59 @@ def attendance_history():
 
     # Apply status filter
     if status:
-        attendance_query = attendance_query.filter(Attendance.status == status)
+        try:
+            status_value = canonical_status(status)
+            attendance_query = attendance_query.filter(Attendance.status == status_value)
+        except ValueError:
+            flash("Invalid status filter.", "error")
 
-    # Apply worker search filter
+    # Apply worker search filter. History stays in date order, so the name rank is not used
     if worker_search:
-        attendance_query = attendance_query.filter(Worker.name.ilike(f'%{worker_search}%'))
-
-    # Get all records for month filter dropdown - use unfiltered query for this
-    all_records_query = Attendance.query.join(Worker).order_by(Attendance.date.desc())
-    all_records = all_records_query.all()
-    available_months = sorted(
-        list({record.date.strftime("%B %Y") for record in all_records}),
-        reverse=True
-    )
-
-    # Paginate filtered results
-    pagination = attendance_query.paginate(page=page, per_page=per_page, error_out=False)
+        attendance_query = attendance_query.filter(name_match(Worker.name, worker_search)[0])
+
+    # Month filter dropdown comes from the maintained month index, not the attendance table
+    months = available_months()
+
+    if period and month_is_compacted(period):
+        # A compacted month is read from the archive, plus any rows restored by later edits
+        worker_ids = [w[0] for w in db.session.query(Worker.id).filter(
+            name_match(Worker.name, worker_search)[0]).all()] if worker_search else None
+        rows = attendance_query.all() + archived_days(period, worker_ids, status_value, date_from_obj, date_to_obj)
+        pagination = keyset_paginate_rows(
+            rows,
+            [('date', date.fromisoformat), ('worker_id', int)],
+            filters,
+            state=state,
+            per_page=per_page
+        )
+    else:
+        # Keyset pages on (date, id); the total is counted once per filter set and carried in the tokens
+        pagination = keyset_paginate(
+            attendance_query,
+            [(Attendance.date, date.fromisoformat), (Attendance.id, int)],
+            filters,
+            state=state,
+            per_page=per_page,
+            count=request.args.get('count', '1') != '0'
+        )
     attendance_records = pagination.items
 
+    # Whole-month figures for the stats bar come from the monthly rollup
+    month_stats = None
+    if period and not (date_from or date_to or status):
+        worker_ids = select(Worker.id).where(name_match(Worker.name, worker_search)[0]) if worker_search else None
+        month_stats = month_totals(period, worker_ids)
+        month_stats['records'] = month_stats['present'] + month_stats['absent'] + \
+            month_stats['late'] + month_stats['leave']
+
     return render_template(
         "attendance_history.html",
         attendance_records=attendance_records,
         pagination=pagination,
-        available_months=available_months,
+        available_months=months,
         selected_month=selected_month,
+        filters=filters,
+        month_stats=month_stats,
         now=date.today()
     )
 
@@ -305,6 +341,108 @@ def attendance_bulk_check():
         logging.error(f"Bulk check error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@attendance_bp.route('/attendance/api/sync', methods=['POST'])
+@login_required()
+def attendance_sync():
+    """
+    Apply a batch of attendance deltas from the attendance page's offline queue.
+    Body: {"changes": [{key, worker_id, date, status, time_in, time_out, notes, updated_at}], "since": ISO}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        outcome = apply_attendance_sync(data.get('changes'), data.get('since'))
+        db.session.commit()
+    except SyncError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Attendance sync error: {e}")
+        return jsonify({'success': False, 'error': 'Sync failed, please retry'}), 500
+
+    if outcome['applied']:
+        schedule_recompute(current_app._get_current_object())
+    return jsonify({'success': True, **outcome})
+
+@attendance_bp.route('/attendance/api/hours')
+@login_required()
+def attendance_hours_report():
+    """
+    Hours, overtime and late arrivals aggregated in the database.
+    ?month=YYYY-MM or ?date_from=&date_to= (inclusive), &group=worker,department,week
+    """
+    if session.get('role') not in ['admin', 'secretary']:
+        return jsonify({'success': False, 'error': 'Not authorized'}), 403
+
+    try:
+        if request.args.get('month'):
+            start, end = month_bounds(request.args['month'])
+        else:
+            start = date.fromisoformat(request.args['date_from'])
+            end = date.fromisoformat(request.args['date_to']) + timedelta(days=1)
+        group_by = [g.strip() for g in request.args.get('group', 'worker').split(',') if g.strip()]
+        report = hours_report(start, end, group_by)
+    except (KeyError, ValueError, ReportError) as e:
+        return jsonify({'success': False, 'error': f'Invalid report request: {e}'}), 400
+
+    return jsonify({'success': True, **report})
+
+@attendance_bp.route('/attendance/api/day_stats')
+@login_required()
+def attendance_day_stats():
+    """
+    Status counts for one day, overall and per department. ?date=YYYY-MM-DD (default today).
+    Answers 304 when the client's ETag still matches, so pages and wallboards can poll it.
+    """
+    try:
+        day = date.fromisoformat(request.args['date']) if request.args.get('date') else date.today()
+    except ValueError:
+        return jsonify({'success': False, 'error': 'date must be YYYY-MM-DD'}), 400
+
+    etag = day_statistics_etag(day)
+    if etag in request.if_none_match:
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify({'success': True, **day_statistics(day)})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@attendance_bp.route('/attendance/import', methods=['POST'])
+@login_required()
+def attendance_import():
+    """
+    Import attendance from a CSV or XLSX sheet uploaded as ``file``.
+    With dry_run=1 the sheet is validated and conflicts reported without saving.
+    """
+    if session.get('role') not in ['admin', 'secretary']:
+        return jsonify({'success': False, 'error': 'Not authorized'}), 403
+
+    # Clock exports are larger than the app-wide upload limit
+    request.max_content_length = current_app.config.get('ATTENDANCE_IMPORT_MAX_BYTES')
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'error': 'Choose a CSV or XLSX file to import'}), 400
+    dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes', 'on')
+
+    try:
+        summary = import_attendance(upload.stream, upload.filename, dry_run=dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except AttendanceImportError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Attendance import error: {e}")
+        return jsonify({'success': False, 'error': 'Import failed, nothing was saved'}), 500
+
+    if not dry_run and (summary['saved'] or summary['updated']):
+        schedule_recompute(current_app._get_current_object())
+    return jsonify({'success': True, **summary})
+
 @attendance_bp.route('/attendance/delete/<int:attendance_id>', methods=['POST'])
 @login_required()
 def delete_attendance(attendance_id):
@@ -319,8 +457,13 @@ def delete_attendance(attendance_id):
 
     try:
         worker_name = att.worker.name
+        mark_dirty([(att.worker_id, att.date)])
         db.session.delete(att)
+        db.session.flush()
+        prune_attendance_months([att.date])
+        refresh_attendance_monthly([(att.worker_id, att.date)])
         db.session.commit()
+        schedule_recompute(current_app._get_current_object())
         flash(f"Attendance record for {worker_name} deleted.", "success")
     except Exception as e:
         db.session.rollback()
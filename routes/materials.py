@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from models import db, Material, MaterialTransaction
 from datetime import date
 from sqlalchemy import or_
+from services.search import name_match
 
 materials_bp = Blueprint('materials', __name__, url_prefix='/materials')
 
@@ -11,12 +12,15 @@ def materials_dashboard():
     category = request.args.get('category', '')
 
     query = Material.query
+    order = [Material.name]
     if search:
-        query = query.filter(Material.name.ilike(f'%{search}%'))
+        criterion, rank = name_match(Material.name, search)
+        query = query.filter(criterion)
+        order.insert(0, rank)
     if category:
         query = query.filter_by(category=category)
 
-    materials = query.order_by(Material.name).all()
+    materials = query.order_by(*order).all()
     categories = db.session.query(Material.category).distinct().all()
 
     # Low stock items
@@ -1,11 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, jsonify, stream_with_context
 from extensions import db
-from models import Worker, Attendance, Salary, PayrollLock, AuditLog
-from utils import login_required
+from models import Worker, Attendance, Salary, PayrollLock, PayrollRun, AuditLog
+from utils import login_required, ListPagination
+from services.payroll_runs import submit_run, active_run, PayrollRunError
+from services.payroll_summary import salary_totals, apply_summary_change, period_totals, summary_periods
+from services.payroll_snapshot import create_snapshot, delete_snapshot, load_snapshot
+from services.audit import audit_page
+from services.payroll_simulator import simulate, SimulationError
+from services.payslip_pdf import prepare_payslip, stream_payslip_zip, PayslipExportError
+from services.payroll_dirty import schedule_recompute
+from services.attendance_archive import schedule_compaction
 from datetime import datetime
+from types import SimpleNamespace
 from calendar import monthrange
-from sqlalchemy import extract, func
+from sqlalchemy import extract, func, select
 import logging
+import io
+import csv
 
 salary_bp = Blueprint('salary', __name__, url_prefix='/salary')
 
@@ -22,30 +33,29 @@ def salary():
 
     is_locked = PayrollLock.query.filter_by(month=period).first()
 
-    # Get or auto-create salary records for this period
-    salary_data = Salary.query.filter_by(month=period).options(db.joinedload(Salary.worker)).all()
+    # Locked periods are served from their frozen snapshot
+    salary_data = load_snapshot(period) if is_locked else None
 
-    if not salary_data:
-        workers = Worker.query.filter_by(is_active=True).all()
-        for w in workers:
-            total_days_present = w.get_month_attendance(period)
-
-            monthly_salary = float(w.amount_of_salary or 0)
-            auto_daily_rate = round(monthly_salary / days_in_month, 2) if days_in_month > 0 else 0
-
-            s = Salary(
-                worker_id=w.id,
-                month=period,
-                total_days_present=total_days_present,
-                daily_rate=auto_daily_rate,
-                deductions=0
-            )
-            s.auto_fill_from_worker()
-            s.calculate()
-            db.session.add(s)
-        db.session.commit()
+    payroll_run = None
+    if salary_data is None:
         salary_data = Salary.query.filter_by(month=period).options(db.joinedload(Salary.worker)).all()
 
+        # A new period is generated by a background run; the page polls it and reloads.
+        # Without active workers there is nothing to generate, and a run would reload forever
+        has_workers = not salary_data and db.session.query(Worker.id).filter(Worker.is_active == True).first()
+        if has_workers and not is_locked and request.method == 'GET':
+            try:
+                payroll_run, _ = submit_run(
+                    current_app._get_current_object(),
+                    period,
+                    'generate',
+                    requested_by=session.get('username', 'Admin')
+                )
+            except PayrollRunError as e:
+                logging.warning(f"Payroll generation for {period} not started: {e}")
+    if payroll_run is None:
+        payroll_run = active_run(period)
+
     # Attach extra display values for template
     for s in salary_data:
         s.days_in_month = days_in_month
@@ -66,7 +76,7 @@ def salary():
     departments = [d[0] for d in departments]
 
     # Audit logs for this period
-    audit_logs = AuditLog.query.filter(AuditLog.details.like(f'%{period}%')).order_by(AuditLog.created_at.desc()).limit(50).all()
+    audit_logs, _ = audit_page(period=period, limit=50)
 
     if request.method == 'POST':
         try:
@@ -82,6 +92,7 @@ def salary():
                 return redirect(url_for('salary.salary', period=period))
 
             # Get or create salary record
+            before = salary_totals(Salary.worker_id == worker_id, Salary.month == period, lock=True)
             salary_record = Salary.query.filter_by(worker_id=worker_id, month=period).first()
 
             if not salary_record:
@@ -109,6 +120,7 @@ def salary():
             salary_record.is_processed = True
             salary_record.calculate()
             db.session.add(salary_record)
+            db.session.flush()
 
             # Audit log
             audit = AuditLog(
@@ -118,9 +130,12 @@ def salary():
                 record_id=salary_record.id,
                 worker_id=worker.id,
                 worker_name=worker.name,
-                details=f'Processed salary for {period}'
+                details=f'Processed salary for {period}',
+                period=period,
+                entity_key=f'salary:{salary_record.id}'
             )
             db.session.add(audit)
+            apply_summary_change(before[1], salary_totals(ids=[salary_record.id])[1])
             db.session.commit()
 
             flash(f"Salary processed successfully for {worker.name}.", "success")
@@ -144,6 +159,7 @@ def salary():
         departments=departments,
         is_locked=bool(is_locked),
         audit_logs=audit_logs,
+        payroll_run=payroll_run.to_dict() if payroll_run else None,
         now=datetime.now()
     )
 
@@ -175,6 +191,7 @@ def save_salary():
             return jsonify({'error': 'Worker not found'}), 404
 
         # Get existing salary or create new one
+        before = salary_totals(Salary.worker_id == worker_id, Salary.month == month, lock=True)
         salary = Salary.query.filter_by(worker_id=worker_id, month=month).first()
         if not salary:
             days_in_month = monthrange(year, mon)[1]
@@ -213,9 +230,13 @@ def save_salary():
             record_id=salary.id,
             worker_id=salary.worker_id,
             worker_name=worker.name,
-            details=f'Processed salary for {month}: days={salary.total_days_present}, rate={salary.daily_rate}, ded={salary.deductions}, net={salary.net_salary}'
+            details=f'Processed salary for {month}: days={salary.total_days_present}, rate={salary.daily_rate}, ded={salary.deductions}, net={salary.net_salary}',
+            period=month,
+            entity_key=f'salary:{salary.id}'
         )
         db.session.add(audit)
+        db.session.flush()
+        apply_summary_change(before[1], salary_totals(ids=[salary.id])[1])
 
         db.session.commit()
 
@@ -234,55 +255,113 @@ def save_salary():
 @salary_bp.route('/save-all', methods=['POST'])
 @login_required(role='admin')
 def save_all_salaries():
-    """Save all pending salaries for a period"""
+    """Process all pending salaries for a period in a background run"""
     period = request.args.get('period', datetime.now().strftime('%Y-%m'))
-
-    if PayrollLock.query.filter_by(month=period).first():
-        return jsonify({'error': 'Period is locked'}), 403
-
-    salaries = Salary.query.filter_by(month=period, is_processed=False).all()
-    count = 0
-
-    for salary in salaries:
-        salary.is_processed = True
-        db.session.add(salary)
-        count += 1
-
-    db.session.commit()
-    return jsonify({'success': True, 'processed': count})
+    return _queue_run(period, 'process')
 
 @salary_bp.route('/bulk-update', methods=['POST'])
 @login_required(role='admin')
 def bulk_update_salaries():
-    """Bulk update selected salaries"""
+    """Bulk update selected salaries in a background run"""
     data = request.get_json()
-    worker_ids = data.get('worker_ids', [])
     month = data.get('month', datetime.now().strftime('%Y-%m'))
-    updates = data.get('updates', {})
+    return _queue_run(month, 'update', {
+        'worker_ids': data.get('worker_ids', []),
+        'updates': data.get('updates', {})
+    })
 
-    if PayrollLock.query.filter_by(month=month).first():
-        return jsonify({'error': 'Period is locked'}), 403
+@salary_bp.route('/runs', methods=['POST'])
+@login_required(role='admin')
+def submit_payroll_run():
+    """Queue a background payroll run (generate, process or update) for a period"""
+    data = request.get_json(silent=True) or request.form
+    period = data.get('period') or request.args.get('period', datetime.now().strftime('%Y-%m'))
+    kind = data.get('kind', 'generate')
 
-    updated = 0
-    for wid in worker_ids:
-        salary = Salary.query.filter_by(worker_id=wid, month=month).first()
-        if not salary:
-            continue
+    try:
+        datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Invalid month format. Use YYYY-MM'}), 400
 
-        if 'daily_rate' in updates:
-            salary.daily_rate = float(updates['daily_rate'])
-        if 'deduction_percent' in updates:
-            gross = float(salary.total_days_present) * float(salary.daily_rate)
-            salary.deductions = (gross * float(updates['deduction_percent'])) / 100
-        if 'status' in updates:
-            salary.is_processed = (updates['status'] == 'processed')
+    options = {}
+    if kind == 'update':
+        options['worker_ids'] = data.get('worker_ids', [])
+        options['updates'] = data.get('updates', {})
 
-        salary.calculate()
-        db.session.add(salary)
-        updated += 1
+    return _queue_run(period, kind, options)
 
-    db.session.commit()
-    return jsonify({'success': True, 'updated': updated})
+def _queue_run(period, kind, options=None):
+    """Submit a payroll run and answer with its status URL for the page to poll"""
+    try:
+        run, created = submit_run(
+            current_app._get_current_object(),
+            period,
+            kind,
+            requested_by=session.get('username', 'Admin'),
+            options=options
+        )
+    except PayrollRunError as e:
+        status = 403 if 'locked' in str(e) else 400
+        return jsonify({'error': str(e)}), status
+
+    return jsonify({
+        'success': True,
+        'created': created,
+        'run': run.to_dict(),
+        'status_url': url_for('salary.payroll_run_status', run_id=run.id)
+    }), 202 if created else 200
+
+@salary_bp.route('/runs/<int:run_id>')
+@login_required(role='admin')
+def payroll_run_status(run_id):
+    """Poll the progress of a payroll run"""
+    run = db.session.get(PayrollRun, run_id)
+    if not run:
+        return jsonify({'error': 'Run not found'}), 404
+    return jsonify(run.to_dict())
+
+@salary_bp.route('/runs')
+@login_required(role='admin')
+def payroll_runs():
+    """Recent payroll runs for a period"""
+    period = request.args.get('period', datetime.now().strftime('%Y-%m'))
+    runs = PayrollRun.query.filter_by(month=period).order_by(PayrollRun.id.desc()).limit(20).all()
+    return jsonify({'period': period, 'runs': [r.to_dict() for r in runs]})
+
+@salary_bp.route('/simulate', methods=['POST'])
+@login_required(role='admin')
+def simulate_payroll():
+    """Read-only what-if evaluation of rate/deduction changes for a period"""
+    data = request.get_json(silent=True) or {}
+    period = data.get('period', datetime.now().strftime('%Y-%m'))
+
+    try:
+        datetime.strptime(period, '%Y-%m')
+    except ValueError:
+        return jsonify({'error': 'Invalid month format. Use YYYY-MM'}), 400
+
+    try:
+        result = simulate(period, data.get('scenarios', []))
+    except SimulationError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result)
+
+@salary_bp.route('/audit')
+@login_required(role='admin')
+def audit_trail():
+    """Keyset-paginated audit entries, filtered by period and/or entity"""
+    entries, next_cursor = audit_page(
+        period=request.args.get('period'),
+        entity_key=request.args.get('entity'),
+        worker_id=request.args.get('worker_id', type=int),
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', 50, type=int)
+    )
+    return jsonify({
+        'entries': [e.to_dict() for e in entries],
+        'next_cursor': next_cursor
+    })
 
 @salary_bp.route('/toggle-lock', methods=['POST'])
 @login_required(role='admin')
@@ -293,6 +372,7 @@ def toggle_lock():
 
     if lock:
         db.session.delete(lock)
+        delete_snapshot(period)
         locked = False
         action = 'unlocked'
     else:
@@ -302,6 +382,7 @@ def toggle_lock():
             note=request.form.get('note', '')
         )
         db.session.add(lock)
+        create_snapshot(period)
         locked = True
         action = 'locked'
 
@@ -309,11 +390,19 @@ def toggle_lock():
         user_name=session.get('username', 'Admin'),
         action=action,
         table_name='payroll_lock',
-        details=f'Period {period} {action}'
+        details=f'Period {period} {action}',
+        period=period,
+        entity_key=f'payroll_lock:{period}'
     )
     db.session.add(audit)
     db.session.commit()
 
+    if not locked:
+        # Attendance edits made while the period was locked can be applied now
+        schedule_recompute(current_app._get_current_object())
+    elif current_app.config.get('ATTENDANCE_COMPACTION'):
+        schedule_compaction(current_app._get_current_object())
+
     return jsonify({'locked': locked, 'message': f'Period {period} {action}'})
 
 @salary_bp.route('/history')
@@ -328,7 +417,10 @@ def salary_history():
     if days_in_month < 1:
         days_in_month = 1
 
-    query = Salary.query.filter_by(month=period)
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 100, type=int)
+
+    query = Salary.query.filter_by(month=period).options(db.joinedload(Salary.worker))
 
     if status_filter == 'processed':
         query = query.filter_by(is_processed=True)
@@ -338,7 +430,32 @@ def salary_history():
     if department_filter!= 'all':
         query = query.join(Worker).filter(Worker.department == department_filter)
 
-    salaries = query.order_by(Salary.payment_date.desc()).all()
+    is_locked = PayrollLock.query.filter_by(month=period).first()
+    snapshot = load_snapshot(period) if is_locked else None
+
+    if snapshot is not None:
+        if status_filter == 'processed':
+            snapshot = [r for r in snapshot if r.is_processed]
+        elif status_filter == 'pending':
+            snapshot = [r for r in snapshot if not r.is_processed]
+        if department_filter!= 'all':
+            snapshot = [r for r in snapshot if r.worker and r.worker.department == department_filter]
+        snapshot.sort(key=lambda r: (r.payment_date or datetime.min, r.id), reverse=True)
+
+        totals = {
+            'count': len(snapshot),
+            'gross': sum(r.gross_salary for r in snapshot),
+            'deductions': sum(r.deductions for r in snapshot),
+            'net': sum(r.net_salary for r in snapshot)
+        }
+        pagination = ListPagination(page=page, per_page=per_page, error_out=False, items=snapshot)
+    else:
+        # Totals come from the maintained summary table; only the shown page is loaded
+        totals = period_totals(period, status_filter, department_filter)
+        pagination = query.order_by(Salary.payment_date.desc(), Salary.id.desc())\
+                          .paginate(page=page, per_page=per_page, error_out=False, count=False)
+        pagination.total = totals['count']
+    salaries = pagination.items
 
     # Attach extra display values
     for s in salaries:
@@ -347,28 +464,22 @@ def salary_history():
         s.attendance_percent = round((s.total_days_present / days_in_month) * 100, 1) if days_in_month > 0 else 0
         s.daily_rate_display = s.daily_rate
 
-    total_gross = sum(s.gross_salary for s in salaries)
-    total_deductions = sum(s.deductions for s in salaries)
-    total_paid = sum(s.net_salary for s in salaries)
-
-    # Build period list
-    available_months = []
-    for y in range(datetime.now().year - 2, datetime.now().year + 2):
-        for m in range(1, 13):
-            available_months.append(f"{y}-{m:02d}")
-    available_months.reverse()
+    available_months = summary_periods()
+    if period not in available_months:
+        available_months.append(period)
+        available_months.sort(reverse=True)
 
     departments = db.session.query(Worker.department).distinct().filter(Worker.department.isnot(None)).all()
     departments = [d[0] for d in departments]
 
-    is_locked = PayrollLock.query.filter_by(month=period).first()
-
     return render_template(
         'salary_history.html',
         salary_records=salaries,
-        total_gross=total_gross,
-        total_deductions=total_deductions,
-        total_paid=total_paid,
+        pagination=pagination,
+        total_records=totals['count'],
+        total_gross=totals['gross'],
+        total_deductions=totals['deductions'],
+        total_paid=totals['net'],
         period=period,
         available_months=available_months,
         departments=departments,
@@ -383,9 +494,16 @@ def salary_history():
 def payslip(worker_id):
     period = request.args.get('period', datetime.now().strftime('%Y-%m'))
 
-    salary = Salary.query.filter_by(worker_id=worker_id, month=period)\
-                    .options(db.joinedload(Salary.worker))\
-                    .first()
+    salary = None
+    if PayrollLock.query.filter_by(month=period).first():
+        snapshot = load_snapshot(period)
+        if snapshot is not None:
+            salary = next((r for r in snapshot if r.worker_id == worker_id), None)
+
+    if salary is None:
+        salary = Salary.query.filter_by(worker_id=worker_id, month=period)\
+                        .options(db.joinedload(Salary.worker))\
+                        .first()
 
     if not salary:
         flash("Payslip not found for this period", "warning")
@@ -402,15 +520,7 @@ def payslip(worker_id):
         days_in_month = 1
 
     # Add display fields to salary object - these are NOT saved to DB
-    salary.days_in_month = days_in_month
-    salary.present_days = salary.total_days_present or 0
-    salary.attendance_percent = round((salary.present_days / days_in_month) * 100, 1) if days_in_month > 0 else 0
-
-    # Ensure numbers are not None for template
-    salary.daily_rate = salary.daily_rate or 0
-    salary.gross_salary = salary.gross_salary or 0
-    salary.deductions = salary.deductions or 0
-    salary.net_salary = salary.net_salary or 0
+    prepare_payslip(salary, days_in_month)
 
     return render_template(
         'payslip.html',
@@ -420,6 +530,45 @@ def payslip(worker_id):
         now=datetime.now()
     )
 
+@salary_bp.route('/payslips/export')
+@login_required(role='admin')
+def export_payslips():
+    """Download every payslip for a period as PDFs in one streamed ZIP"""
+    period = request.args.get('period', datetime.now().strftime('%Y-%m'))
+    year, month = map(int, period.split('-'))
+    days_in_month = monthrange(year, month)[1]
+
+    records = load_snapshot(period) if PayrollLock.query.filter_by(month=period).first() else None
+    if records is None:
+        records = Salary.query.filter_by(month=period)\
+                        .options(db.joinedload(Salary.worker))\
+                        .order_by(Salary.id)\
+                        .yield_per(200)
+
+    try:
+        payslips = stream_payslip_zip(
+            records,
+            period,
+            days_in_month,
+            static_folder=current_app.static_folder,
+            host_url=request.host_url
+        )
+    except PayslipExportError as e:
+        # Fail before any ZIP bytes go out, rather than truncating the download
+        logging.error(f"Payslip export for {period} failed: {e}")
+        flash(f"Could not export payslips: {e}", "error")
+        return redirect(url_for('salary.salary', period=period))
+
+    return current_app.response_class(
+        stream_with_context(payslips),
+        mimetype='application/zip',
+        headers={"Content-disposition": f"attachment; filename=payslips_{period}.zip"}
+    )
+
+CSV_HEADER = ['Worker Code', 'Name', 'Department', 'Days Present', 'Days in Month', 'Attendance %',
+              'Daily Rate', 'Gross', 'Deductions', 'Net', 'Bank', 'Account No', 'Status']
+CSV_BATCH_SIZE = 1000
+
 @salary_bp.route('/export-csv')
 @login_required(role='admin')
 def export_csv():
@@ -427,25 +576,78 @@ def export_csv():
     year, month = map(int, period.split('-'))
     days_in_month = monthrange(year, month)[1]
 
-    salaries = Salary.query.filter_by(month=period).options(db.joinedload(Salary.worker)).all()
-
-    csv_data = "Worker Code,Name,Department,Days Present,Days in Month,Attendance %,Daily Rate,Gross,Deductions,Net,Bank,Account No,Status\n"
-    for s in salaries:
-        present = s.total_days_present
-        percent = round((present / days_in_month) * 100, 1) if days_in_month > 0 else 0
-        worker = s.worker
-        worker_code = worker.worker_code if worker else ''
-        worker_name = worker.name if worker else 'Unknown'
-        worker_dept = worker.department if worker else ''
-        bank_name = s.bank_name or (worker.bank_name if worker else '')
-        bank_account = s.bank_account or (worker.bank_account if worker else '')
-
-        csv_data += f"{worker_code},{worker_name},{worker_dept},{present},{days_in_month},{percent},"
-        csv_data += f"{s.daily_rate},{s.gross_salary},{s.deductions},{s.net_salary},"
-        csv_data += f"{bank_name},{bank_account},{'Processed' if s.is_processed else 'Pending'}\n"
+    stmt = select(
+        Worker.worker_code,
+        Worker.name,
+        Worker.department,
+        Worker.bank_name.label('worker_bank_name'),
+        Worker.bank_account.label('worker_bank_account'),
+        Salary.total_days_present,
+        Salary.daily_rate,
+        Salary.gross_salary,
+        Salary.deductions,
+        Salary.net_salary,
+        Salary.bank_name,
+        Salary.bank_account,
+        Salary.is_processed
+    ).select_from(Salary).outerjoin(Worker, Salary.worker_id == Worker.id)\
+     .where(Salary.month == period)\
+     .order_by(Salary.id)\
+     .execution_options(yield_per=CSV_BATCH_SIZE)
+
+    snapshot = load_snapshot(period) if PayrollLock.query.filter_by(month=period).first() else None
+    if snapshot is not None:
+        snapshot_rows = [SimpleNamespace(
+            worker_code=r.worker.worker_code if r.worker else None,
+            name=r.worker.name if r.worker else None,
+            department=r.worker.department if r.worker else None,
+            worker_bank_name=r.worker.bank_name if r.worker else None,
+            worker_bank_account=r.worker.bank_account if r.worker else None,
+            total_days_present=r.total_days_present,
+            daily_rate=r.daily_rate,
+            gross_salary=r.gross_salary,
+            deductions=r.deductions,
+            net_salary=r.net_salary,
+            bank_name=r.bank_name,
+            bank_account=r.bank_account,
+            is_processed=r.is_processed
+        ) for r in snapshot]
+        batches = [snapshot_rows[i:i + CSV_BATCH_SIZE] for i in range(0, len(snapshot_rows), CSV_BATCH_SIZE)]
+    else:
+        batches = None
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow(CSV_HEADER)
+        yield buffer.getvalue()
+
+        for rows in (batches if batches is not None else db.session.execute(stmt).partitions()):
+            buffer.seek(0)
+            buffer.truncate()
+            for r in rows:
+                present = r.total_days_present
+                percent = round((present / days_in_month) * 100, 1) if days_in_month > 0 else 0
+                writer.writerow([
+                    r.worker_code or '',
+                    r.name or 'Unknown',
+                    r.department or '',
+                    present,
+                    days_in_month,
+                    percent,
+                    r.daily_rate,
+                    r.gross_salary,
+                    r.deductions,
+                    r.net_salary,
+                    r.bank_name or r.worker_bank_name or '',
+                    r.bank_account or r.worker_bank_account or '',
+                    'Processed' if r.is_processed else 'Pending'
+                ])
+            yield buffer.getvalue()
 
     return current_app.response_class(
-        csv_data,
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={"Content-disposition": f"attachment; filename=salary_{period}.csv"}
-    )
\ No newline at end of file
+    )
@@ -1,21 +1,27 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, current_app, send_file, abort
 from extensions import db, mail
-from models import Worker, EmailLog, Attendance, Salary
-from utils import login_required, allowed_file, get_passport_url, safe_date
+from models import Worker, EmailLog, Attendance, AttendanceArchive, AttendanceMonthly, Salary, AuditLog
+from utils import login_required, allowed_file, get_passport_url, safe_date, decode_cursor, keyset_paginate
 from services.hr_letter import generate_hr_letter
+from services.payroll_summary import salary_totals, apply_summary_change
+from services.attendance import prune_attendance_months
+from services.search import name_match
+from services.worker_codes import next_worker_code
+from services.passport_upload import stage_passport, schedule_passport_upload, schedule_passport_delete, IN_FLIGHT
+from services.qr_cache import worker_qr_base64, forget_worker_qr
 import os
 import uuid
 from werkzeug.utils import secure_filename
 from datetime import datetime
-import json
-import qrcode
-import base64
-from io import BytesIO
 import traceback
 import requests
+from sqlalchemy import select, union, func, case, literal
+from sqlalchemy.orm import with_expression
 
 workers_bp = Blueprint('workers', __name__, url_prefix='/workers')
 
+WORKERS_PER_PAGE = 100
+
 @workers_bp.route('/register_worker', methods=['GET', 'POST'])
 @login_required(role='admin')
 def register_worker():
@@ -111,40 +117,20 @@ def register_worker():
                     return redirect(url_for('workers.register_worker'))
 
             # ===============================
-            # 6. PASSPORT UPLOAD - CLOUDINARY
+            # 6. PASSPORT CHECK
             # ===============================
-            passport_url = None
+            # The file is staged once the worker has an id and uploaded in the background
             passport_file = request.files.get('passport')
+            has_passport = bool(passport_file and passport_file.filename.strip())
 
-            if passport_file and passport_file.filename.strip():
-                if not allowed_file(passport_file.filename):
-                    flash("Only image files (jpg, jpeg, png, gif, webp) allowed.", "danger")
-                    return redirect(url_for('workers.register_worker'))
-
-                import cloudinary.uploader
-                result = cloudinary.uploader.upload(
-                    passport_file,
-                    folder="okoya_passports",
-                    transformation=[{"width": 500, "height": 500, "crop": "fill"}],
-                    resource_type="image"
-                )
-                passport_url = result['secure_url']
-                current_app.logger.info(f"[PASSPORT UPLOADED] {passport_url}")
+            if has_passport and not allowed_file(passport_file.filename):
+                flash("Only image files (jpg, jpeg, png, gif, webp) allowed.", "danger")
+                return redirect(url_for('workers.register_worker'))
 
             # ===============================
             # 7. AUTO WORKER CODE
             # ===============================
-            last_worker = Worker.query.order_by(Worker.id.desc()).first()
-            if last_worker and last_worker.worker_code:
-                try:
-                    last_number = int(last_worker.worker_code.replace("OFCL", ""))
-                    new_number = last_number + 1
-                except:
-                    new_number = (last_worker.id or 0) + 1
-            else:
-                new_number = 1
-
-            worker_code = f"OFCL{new_number:04d}"
+            worker_code = next_worker_code()
 
             # ===============================
             # 8. CREATE WORKER
@@ -170,7 +156,7 @@ def register_worker():
                 bank_account_name=bank_account_name,
                 bank_name=bank_name,
                 bank_account=bank_account,
-                passport=passport_url,
+                passport=None,
                 is_active=True
             )
 
@@ -178,8 +164,24 @@ def register_worker():
             # 9. SAVE
             # ===============================
             db.session.add(new_worker)
+            db.session.flush()
+            staged_path = stage_passport(passport_file, new_worker) if has_passport else None
+
+            db.session.add(AuditLog(
+                user_name=session.get('username', 'Admin'),
+                action='created',
+                table_name='workers',
+                record_id=new_worker.id,
+                worker_id=new_worker.id,
+                worker_name=new_worker.name,
+                details=f'Registered worker {worker_code}',
+                entity_key=f'worker:{new_worker.id}'
+            ))
             db.session.commit()
 
+            if staged_path:
+                schedule_passport_upload(current_app._get_current_object(), new_worker.id, staged_path)
+
             current_app.logger.info(f"[WORKER CREATED] {worker_code} - {name}")
             flash(f"Worker registered successfully! Code: {worker_code}", "success")
             return render_template('register_worker.html', worker=new_worker)
@@ -198,9 +200,36 @@ def workers_name():
         flash("You are not authorized to access this page.", "error")
         return redirect(url_for('secretary.secretary_dashboard'))
 
-    workers = Worker.query.order_by(Worker.id.desc()).all()
+    state = decode_cursor(request.args.get('cursor'))
+    if state and isinstance(state.get('f'), dict):
+        filters = state['f']
+    else:
+        state = None
+        filters = {'q': request.args.get('q', '').strip()}
+
+    query = Worker.query
+    keys = [(Worker.id, int)]
+    if filters.get('q'):
+        term = filters['q']
+        criterion, rank = name_match(Worker.name, term)
+        exact = (Worker.worker_code == term.upper()) | (Worker.phone_number == term)
+        # One indexed branch per column, so no branch degrades to a table scan
+        matches = union(
+            select(Worker.id).where(criterion),
+            select(Worker.id).where(Worker.worker_code == term.upper()),
+            select(Worker.id).where(Worker.phone_number == term),
+            select(Worker.id).where(func.lower(Worker.position) == term.lower())
+        )
+        # Exact code or phone hits first, then the closest names; pages run newest-first on the keys
+        search_rank = -case((exact, literal(-1000.0)), else_=rank)
+        query = query.filter(Worker.id.in_(matches)).options(with_expression(Worker.search_rank, search_rank))
+        keys.insert(0, (search_rank.label('search_rank'), float))
+
+    pagination = keyset_paginate(query, keys, filters, state=state,
+                                 per_page=WORKERS_PER_PAGE, count=True)
     new_worker_id = request.args.get('new_id', type=int)
-    return render_template('workers_name.html', workers=workers, new_worker_id=new_worker_id)
+    return render_template('workers_name.html', workers=pagination.items, pagination=pagination,
+                           filters=filters, new_worker_id=new_worker_id)
 
 @workers_bp.route('/toggle_worker_status/<int:worker_id>', methods=['POST'])
 @login_required(role='admin')
@@ -229,6 +258,18 @@ def toggle_worker_status(worker_id):
         worker.warning_count = (worker.warning_count or 0) + 1
 
     worker.status_letter = generate_hr_letter(worker, reason, worker.status_type)
+
+    db.session.add(AuditLog(
+        user_name=session.get('username', 'Admin'),
+        action=worker.status_type,
+        table_name='workers',
+        record_id=worker.id,
+        worker_id=worker.id,
+        worker_name=worker.name,
+        details=f'Worker {worker.worker_code} {worker.status_type}: {reason}',
+        period=now.strftime('%Y-%m'),
+        entity_key=f'worker:{worker.id}'
+    ))
     db.session.commit()
     flash(f"{worker.name} status updated successfully.", "success")
     return redirect(url_for('workers.workers_name'))
@@ -373,6 +414,14 @@ def edit_worker(worker_id):
             worker.bank_account_name = (request.form.get('bank_account_name') or "").strip()
             worker.guarantor = (request.form.get('guarantor') or "").strip()
 
+            # Payroll totals are kept per department; move this worker's salary rows with it
+            department = (request.form.get('department') or "").strip() or None
+            if 'department' in request.form and department != worker.department:
+                before = salary_totals(Salary.worker_id == worker.id, lock=True)
+                worker.department = department
+                db.session.flush()
+                apply_summary_change(before[1], salary_totals(ids=before[0])[1])
+
             try:
                 worker.amount_of_salary = float(request.form.get('amount_of_salary') or 0)
             except ValueError:
@@ -387,32 +436,30 @@ def edit_worker(worker_id):
             worker.date_of_birth = safe_date(request.form.get('date_of_birth'))
             worker.date_of_employment = safe_date(request.form.get('date_of_employment'))
 
-            # PASSPORT UPLOAD - CLOUDINARY
+            # PASSPORT - staged now, uploaded in the background; the old photo is
+            # replaced (and deleted from storage) once the upload succeeds
+            staged_path = None
             passport_file = request.files.get('passport')
             if passport_file and passport_file.filename:
                 if allowed_file(passport_file.filename):
-                    import cloudinary.uploader
-
-                    if worker.passport and 'cloudinary.com' in worker.passport:
-                        try:
-                            public_id = worker.passport.split('/upload/')[1].rsplit('.', 1)[0]
-                            cloudinary.uploader.destroy(public_id)
-                        except Exception as e:
-                            current_app.logger.warning(f"Failed to delete old passport: {e}")
-
-                    result = cloudinary.uploader.upload(
-                        passport_file,
-                        folder="okoya_passports",
-                        transformation=[{"width": 500, "height": 500, "crop": "fill"}],
-                        resource_type="image"
-                    )
-                    worker.passport = result['secure_url']
-                    worker.updated_at = datetime.utcnow()
+                    staged_path = stage_passport(passport_file, worker)
                 else:
                     flash("Only jpg, jpeg, png, gif, webp files allowed.", "danger")
                     return redirect(url_for('workers.edit_worker', worker_id=worker.id))
 
+            db.session.add(AuditLog(
+                user_name=session.get('username', 'Admin'),
+                action='updated',
+                table_name='workers',
+                record_id=worker.id,
+                worker_id=worker.id,
+                worker_name=worker.name,
+                details=f'Updated details for worker {worker.worker_code}',
+                entity_key=f'worker:{worker.id}'
+            ))
             db.session.commit()
+            if staged_path:
+                schedule_passport_upload(current_app._get_current_object(), worker.id, staged_path)
             flash('Worker details updated successfully.', 'success')
             return redirect(url_for('workers.workers_name'))
 
@@ -427,39 +474,25 @@ def edit_worker(worker_id):
 @login_required(role='admin')
 def worker_id_card(worker_id):
     worker = Worker.query.get_or_404(worker_id)
-    passport_url = worker.passport or url_for('static', filename='logo.png')
+    passport_url = get_passport_url(worker, 'card') if worker.passport or worker.passport_status in IN_FLIGHT \
+        else url_for('static', filename='logo.png')
 
     verify_url = url_for('workers.verify_worker', worker_code=worker.worker_code, _external=True)
-
-    qr_data = {
-        "company": "OKOYA FOOD COMPANY LIMITED",
-        "worker_code": worker.worker_code,
-        "name": worker.name,
-        "position": worker.position,
-        "phone": worker.phone_number or "N/A",
-        "status": "Active" if worker.is_active else "Inactive",
-        "verify_url": verify_url
-    }
-
-    qr_string = json.dumps(qr_data, ensure_ascii=False)
-
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=4,
-        border=2
-    )
-    qr.add_data(qr_string)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
-
-    buffer = BytesIO()
-    img.save(buffer, format="PNG")
-    buffer.seek(0)
-    qr_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+    qr_base64 = worker_qr_base64(worker, verify_url)
 
     return render_template('worker_id_card.html', worker=worker, qr_code=qr_base64, passport_url=passport_url)
 
+@workers_bp.route('/<int:worker_id>/passport/staged')
+@login_required()
+def staged_passport(worker_id):
+    """The locally staged passport, shown until its background upload finishes."""
+    worker = Worker.query.get_or_404(worker_id)
+    if worker.passport_status not in IN_FLIGHT or not worker.passport_staged or not os.path.exists(worker.passport_staged):
+        abort(404)
+    response = send_file(worker.passport_staged, max_age=0)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
 @workers_bp.route('/verify/<worker_code>')
 def verify_worker(worker_code):
     worker = Worker.query.filter_by(worker_code=worker_code).first_or_404()
@@ -471,19 +504,40 @@ def delete_worker(worker_id):
     worker = Worker.query.get_or_404(worker_id)
 
     try:
-        if worker.passport and 'cloudinary.com' in worker.passport:
-            import cloudinary.uploader
-            try:
-                public_id = worker.passport.split('/upload/')[1].rsplit('.', 1)[0]
-                cloudinary.uploader.destroy(public_id)
-            except Exception as e:
-                current_app.logger.warning(f"Failed to delete passport: {e}")
+        passport_url, staged_path = worker.passport, worker.passport_staged
+        _, salary_before = salary_totals(Salary.worker_id == worker.id, lock=True)
 
         db.session.query(EmailLog).filter_by(worker_id=worker.id).delete()
+        attendance_days = {d[0].replace(day=1) for d in db.session.query(Attendance.date).filter_by(worker_id=worker.id).all()}
+        attendance_days |= {m[0] for m in db.session.query(AttendanceArchive.month).filter_by(worker_id=worker.id).all()}
         db.session.query(Attendance).filter_by(worker_id=worker.id).delete()
+        db.session.query(AttendanceArchive).filter_by(worker_id=worker.id).delete()
+        db.session.query(AttendanceMonthly).filter_by(worker_id=worker.id).delete()
         db.session.query(Salary).filter_by(worker_id=worker.id).delete()
+
+        # Audit history outlives the worker; detach it from the FK and keep the entity key
+        db.session.query(AuditLog).filter_by(worker_id=worker.id).update({'worker_id': None})
+        db.session.add(AuditLog(
+            user_name=session.get('username', 'Admin'),
+            action='deleted',
+            table_name='workers',
+            record_id=worker.id,
+            worker_name=worker.name,
+            details=f'Deleted worker {worker.worker_code}',
+            entity_key=f'worker:{worker.id}'
+        ))
         db.session.delete(worker)
+
+        # Keep payroll totals in step with the removed salary rows
+        apply_summary_change(salary_before, {})
+        prune_attendance_months(attendance_days)
         db.session.commit()
+
+        # Stored files go only after the row is gone; an upload still in flight cleans up after itself
+        schedule_passport_delete(current_app._get_current_object(), passport_url)
+        if staged_path and os.path.exists(staged_path):
+            os.remove(staged_path)
+        forget_worker_qr(worker_id)
         flash('Worker deleted successfully.', 'success')
 
     except Exception as e:
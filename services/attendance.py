@@ -0,0 +1,186 @@
+from extensions import db
+from models import Worker, Attendance, AttendanceMonth, AttendanceArchive
+from services.bulk import dialect_insert, supports_upsert
+from services.attendance_queries import canonical_status, in_month, month_key
+from services.attendance_monthly import refresh_attendance_monthly
+from services.attendance_archive import restore_archived
+from datetime import datetime
+from sqlalchemy import func, or_
+import logging
+
+
+def parse_time(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%H:%M').time()
+
+
+def parse_attendance_records(records, day):
+    """
+    Validate raw attendance dicts (worker_id, status, time_in, time_out, notes)
+    for one day. Returns (rows, results): rows ready to upsert, and one result
+    entry per input record with failures already filled in.
+    """
+    results = []
+    rows_by_worker = {}
+
+    for index, item in enumerate(records):
+        result = {'index': index, 'worker_id': item.get('worker_id') if isinstance(item, dict) else None}
+        results.append(result)
+        try:
+            worker_id = int(item.get('worker_id'))
+            if not worker_id or not item.get('status'):
+                raise ValueError("worker_id and status are required")
+            status = canonical_status(item.get('status'))
+
+            row = {
+                'worker_id': worker_id,
+                'date': day,
+                'status': status,
+                'time_in': parse_time(item.get('time_in')),
+                'time_out': parse_time(item.get('time_out')),
+                'notes': (item.get('notes') or '').strip()[:100]
+            }
+        except (AttributeError, TypeError, ValueError) as e:
+            result.update(result='failed', error=str(e))
+            continue
+
+        result['worker_id'] = worker_id
+        previous = rows_by_worker.get(worker_id)
+        if previous:
+            # A later record for the same worker wins; the earlier one was not an error
+            results[previous[0]].update(result='superseded', error='superseded by a later record in the batch')
+        rows_by_worker[worker_id] = (index, row)
+
+    # One lookup for unknown workers instead of letting the FK fail the whole batch
+    known = {w[0] for w in db.session.query(Worker.id).filter(Worker.id.in_(list(rows_by_worker))).all()} \
+        if rows_by_worker else set()
+    rows = []
+    for worker_id, (index, row) in rows_by_worker.items():
+        if worker_id not in known:
+            results[index].update(result='failed', error='worker not found')
+        else:
+            rows.append((index, row))
+
+    return rows, results
+
+
+def upsert_attendance(rows, newer_only=False, existing=None):
+    """
+    Write attendance rows keyed on the _worker_date_uc constraint with a single
+    INSERT ... ON CONFLICT (worker_id, date) DO UPDATE. Returns the set of
+    (worker_id, date) keys that already existed, i.e. were updated.
+
+    With ``newer_only`` each row carries its own ``updated_at`` and only
+    replaces a stored row whose updated_at is older (last writer wins).
+    Callers that already know which keys exist can pass them as ``existing``
+    to skip that lookup; they must also have restored any compacted months.
+    """
+    if not rows:
+        return set()
+
+    worker_ids = {r['worker_id'] for r in rows}
+    dates = {r['date'] for r in rows}
+    if existing is None:
+        restore_archived((r['worker_id'], r['date']) for r in rows)
+        keys = {(r['worker_id'], r['date']) for r in rows}
+        existing = {
+            (w, d) for w, d in db.session.query(Attendance.worker_id, Attendance.date).filter(
+                Attendance.worker_id.in_(worker_ids),
+                Attendance.date.in_(dates)
+            ).all()
+            if (w, d) in keys
+        }
+
+    if supports_upsert():
+        # Executemany with one cached statement; a multi-row VALUES literal is recompiled per batch
+        stmt = dialect_insert(Attendance.__table__)
+        guard = None
+        if newer_only:
+            guard = or_(Attendance.updated_at.is_(None), Attendance.updated_at < stmt.excluded.updated_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['worker_id', 'date'],
+            set_={
+                'status': stmt.excluded.status,
+                'time_in': stmt.excluded.time_in,
+                'time_out': stmt.excluded.time_out,
+                'notes': stmt.excluded.notes,
+                'updated_at': stmt.excluded.updated_at if newer_only else func.now()
+            },
+            where=guard
+        )
+        db.session.execute(stmt, rows)
+    else:
+        current = {
+            (a.worker_id, a.date): a for a in Attendance.query.filter(
+                Attendance.worker_id.in_(worker_ids),
+                Attendance.date.in_(dates)
+            ).all()
+        }
+        for r in rows:
+            att = current.get((r['worker_id'], r['date']))
+            if att:
+                if newer_only and att.updated_at and att.updated_at >= r['updated_at']:
+                    continue
+                att.status, att.time_in, att.time_out, att.notes = r['status'], r['time_in'], r['time_out'], r['notes']
+                if newer_only:
+                    att.updated_at = r['updated_at']
+            else:
+                db.session.add(Attendance(**r))
+
+    return existing
+
+
+def bulk_save_attendance(records, day):
+    """
+    Parse, validate and upsert a batch of attendance records for one day.
+    Returns saved/updated/superseded/failed counts plus a per-record result
+    list; superseded records lost to a later record for the same worker.
+    The caller commits.
+    """
+    parsed, results = parse_attendance_records(records, day)
+    rows = [row for _, row in parsed]
+    existing = upsert_attendance(rows)
+    note_attendance_months(r['date'] for r in rows)
+    db.session.flush()
+    refresh_attendance_monthly((r['worker_id'], r['date']) for r in rows)
+
+    for index, row in parsed:
+        results[index]['result'] = 'updated' if (row['worker_id'], row['date']) in existing else 'saved'
+
+    counts = {'saved': 0, 'updated': 0, 'superseded': 0, 'failed': 0}
+    for r in results:
+        counts[r['result']] += 1
+        if r['result'] == 'failed':
+            logging.error(f"Bulk save error for worker {r.get('worker_id')}: {r.get('error')}")
+
+    return {**counts, 'results': results, 'rows': rows}
+
+
+def note_attendance_months(days):
+    """Record the months of newly written attendance dates. Runs in the caller's transaction."""
+    months = {month_key(d) for d in days if d}
+    if not months:
+        return
+    if supports_upsert():
+        stmt = dialect_insert(AttendanceMonth).values([{'month': m} for m in months])
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=['month']))
+    else:
+        known = {m[0] for m in db.session.query(AttendanceMonth.month).filter(AttendanceMonth.month.in_(months)).all()}
+        for month in months - known:
+            db.session.add(AttendanceMonth(month=month))
+
+
+def prune_attendance_months(days):
+    """Drop index entries for months that no longer have any attendance rows, raw or compacted."""
+    for month in {month_key(d) for d in days if d}:
+        still_used = db.session.query(Attendance.id).filter(in_month(month)).limit(1).first() or \
+            db.session.query(AttendanceArchive.id).filter_by(month=month).limit(1).first()
+        if not still_used:
+            AttendanceMonth.query.filter_by(month=month).delete()
+
+
+def available_months():
+    """Months with attendance, newest first, as "Month Year" labels for the history filter."""
+    months = db.session.query(AttendanceMonth.month).order_by(AttendanceMonth.month.desc()).all()
+    return [datetime.strptime(m[0], '%Y-%m').strftime('%B %Y') for m in months]
@@ -0,0 +1,321 @@
+from extensions import db
+from models import Worker, Attendance, AttendanceArchive, PayrollLock
+from services.attendance_queries import in_month, month_bounds, month_key, canonical_status
+from collections import defaultdict
+from datetime import date, datetime, timedelta, time as dtime
+from sqlalchemy import insert, delete
+import json
+import logging
+import struct
+import threading
+
+# One slot per possible day of the month
+DAYS = 31
+NO_TIME = 0xFFFFFFFF
+_TIMES = struct.Struct(f'>{DAYS}I')
+# Per-day updated_at as microseconds since the epoch; 0 = no stamp
+NO_STAMP = 0
+_STAMPS = struct.Struct(f'>{DAYS}q')
+EPOCH = datetime(1970, 1, 1)
+# Day bitmap column for each canonical status
+BITMAPS = {
+    'Present': 'present_days',
+    'Absent': 'absent_days',
+    'Late': 'late_days',
+    'Leave': 'leave_days',
+}
+INSERT_CHUNK = 1000
+
+
+class ArchivedDay:
+    """Read-only stand-in for an Attendance row expanded from the archive."""
+    id = None
+    duration = Attendance.duration
+
+    def __init__(self, worker, day, status, time_in, time_out, notes):
+        self.worker = worker
+        self.worker_id = worker.id if worker else None
+        self.worker_code = worker.worker_code if worker else None
+        self.date = day
+        self.status = status
+        self.time_in = time_in
+        self.time_out = time_out
+        self.notes = notes
+
+
+def _seconds(value):
+    return NO_TIME if value is None else value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _time(seconds):
+    return None if seconds == NO_TIME else dtime(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _stamp(value):
+    return NO_STAMP if value is None else (value - EPOCH) // timedelta(microseconds=1)
+
+
+def _datetime(stamp):
+    return None if stamp == NO_STAMP else EPOCH + timedelta(microseconds=stamp)
+
+
+def packable(row):
+    """True when an attendance row (dict) has a status that maps onto one of the bitmaps."""
+    try:
+        canonical_status(row['status'])
+    except ValueError:
+        return False
+    return True
+
+
+def pack_month(worker_id, month, rows):
+    """
+    Build one archive record from a worker's attendance rows (dicts) for a
+    month. Statuses are canonicalized first; every row must be packable().
+    """
+    bitmaps = dict.fromkeys(BITMAPS.values(), 0)
+    times_in = [NO_TIME] * DAYS
+    times_out = [NO_TIME] * DAYS
+    stamps = [NO_STAMP] * DAYS
+    notes = {}
+    updated_at = None
+    for row in rows:
+        day = row['date'].day
+        bitmaps[BITMAPS[canonical_status(row['status'])]] |= 1 << (day - 1)
+        times_in[day - 1] = _seconds(row['time_in'])
+        times_out[day - 1] = _seconds(row['time_out'])
+        stamps[day - 1] = _stamp(row['updated_at'])
+        if row['notes']:
+            notes[str(day)] = row['notes']
+        if row['updated_at'] and (updated_at is None or row['updated_at'] > updated_at):
+            updated_at = row['updated_at']
+    return {
+        'worker_id': worker_id,
+        'month': month,
+        **bitmaps,
+        'times_in': _TIMES.pack(*times_in),
+        'times_out': _TIMES.pack(*times_out),
+        'updated_times': _STAMPS.pack(*stamps),
+        'notes': json.dumps(notes) if notes else None,
+        'updated_at': updated_at
+    }
+
+
+def unpack_record(record):
+    """
+    Expand an archive record back into attendance row dicts, in day order.
+    Each day keeps its own updated_at, so last-writer-wins checks after a
+    restore see when that day changed, not the latest change in the month.
+    """
+    start, _ = month_bounds(record.month)
+    times_in = _TIMES.unpack(record.times_in)
+    times_out = _TIMES.unpack(record.times_out)
+    stamps = _STAMPS.unpack(record.updated_times) if record.updated_times else (NO_STAMP,) * DAYS
+    notes = json.loads(record.notes) if record.notes else {}
+    rows = []
+    for status, column in BITMAPS.items():
+        bits = getattr(record, column)
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            bits ^= low
+            rows.append({
+                'worker_id': record.worker_id,
+                'date': start.replace(day=index + 1),
+                'status': status,
+                'time_in': _time(times_in[index]),
+                'time_out': _time(times_out[index]),
+                'notes': notes.get(str(index + 1), ''),
+                'updated_at': _datetime(stamps[index]) or record.updated_at
+            })
+    rows.sort(key=lambda r: r['date'])
+    return rows
+
+
+def _records(month=None, worker_ids=None, pairs=None):
+    query = AttendanceArchive.query
+    if month:
+        query = query.filter(AttendanceArchive.month == month)
+    if worker_ids is not None:
+        query = query.filter(AttendanceArchive.worker_id.in_(worker_ids))
+    if pairs is not None:
+        if not pairs:
+            return []
+        query = query.filter(
+            AttendanceArchive.worker_id.in_({worker_id for worker_id, _ in pairs}),
+            AttendanceArchive.month.in_({month for _, month in pairs})
+        )
+        return [r for r in query.all() if (r.worker_id, r.month) in pairs]
+    return query.all()
+
+
+def compacted_months():
+    """YYYY-MM months that have at least one archive record."""
+    return {m[0] for m in db.session.query(AttendanceArchive.month).distinct().all()}
+
+
+def month_is_compacted(month):
+    return db.session.query(AttendanceArchive.id).filter_by(month=month).limit(1).first() is not None
+
+
+def archive_totals(month, worker_ids=None):
+    """
+    Rollup rows (as for attendance_monthly) for archived worker-months.
+    Day counts are popcounts of the bitmaps; hours come from the packed times.
+    """
+    totals = []
+    for record in _records(month, worker_ids):
+        times_in = _TIMES.unpack(record.times_in)
+        times_out = _TIMES.unpack(record.times_out)
+        seconds = 0
+        for t_in, t_out in zip(times_in, times_out):
+            if t_in != NO_TIME and t_out != NO_TIME:
+                seconds += t_out - t_in if t_out >= t_in else t_out - t_in + 86400
+        totals.append({
+            'worker_id': record.worker_id,
+            'month': record.month,
+            'present': record.present_days.bit_count(),
+            'absent': record.absent_days.bit_count(),
+            'late': record.late_days.bit_count(),
+            'leave': record.leave_days.bit_count(),
+            'total_hours': seconds / 3600.0,
+            'updated_at': datetime.utcnow()
+        })
+    return totals
+
+
+def archived_days(month, worker_ids=None, status=None, start=None, end=None):
+    """
+    Archived attendance for a month as ArchivedDay objects, optionally
+    narrowed to some workers, one status and an inclusive date range.
+    """
+    records = _records(month, worker_ids)
+    workers = {w.id: w for w in Worker.query.filter(Worker.id.in_({r.worker_id for r in records})).all()} \
+        if records else {}
+    days = []
+    for record in records:
+        worker = workers.get(record.worker_id)
+        for row in unpack_record(record):
+            if status and row['status'] != status:
+                continue
+            if (start and row['date'] < start) or (end and row['date'] > end):
+                continue
+            days.append(ArchivedDay(worker, row['date'], row['status'], row['time_in'], row['time_out'], row['notes']))
+    return days
+
+
+def archived_rows(pairs):
+    """Stored values of archived worker-days, keyed by (worker_id, date), for (worker_id, date) pairs."""
+    pairs = set(pairs)
+    wanted = {(worker_id, month_key(day)) for worker_id, day in pairs}
+    found = {}
+    for record in _records(pairs=wanted):
+        for row in unpack_record(record):
+            if (row['worker_id'], row['date']) in pairs:
+                found[(row['worker_id'], row['date'])] = row
+    return found
+
+
+def restore_archived(pairs):
+    """
+    Move the archived worker-months touched by (worker_id, date-or-YYYY-MM)
+    pairs back into attendance rows, so a write to a compacted month edits
+    ordinary rows. Runs in the caller's transaction; returns records restored.
+    """
+    wanted = {(int(worker_id), month_key(when)) for worker_id, when in pairs if worker_id and when}
+    records = _records(pairs=wanted)
+    if not records:
+        return 0
+
+    rows = [row for record in records for row in unpack_record(record)]
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(insert(Attendance.__table__), rows[start:start + INSERT_CHUNK])
+    db.session.execute(delete(AttendanceArchive).where(AttendanceArchive.id.in_([r.id for r in records])))
+    return len(records)
+
+
+def _month_rows(month, worker_ids=None):
+    query = db.session.query(
+        Attendance.id, Attendance.worker_id, Attendance.date, Attendance.status,
+        Attendance.time_in, Attendance.time_out, Attendance.notes, Attendance.updated_at
+    ).filter(in_month(month))
+    if worker_ids is not None:
+        query = query.filter(Attendance.worker_id.in_(worker_ids))
+    return [row._asdict() for row in query.all()]
+
+
+def compact_month(month):
+    """
+    Pack every attendance row of a YYYY-MM month into per-worker archive
+    records and delete the rows. Runs in the caller's transaction. Rows
+    whose status has no bitmap (legacy values such as 'Half Day') stay in
+    the attendance table, where the history view still reads them.
+    """
+    workers = {row['worker_id'] for row in _month_rows(month) if packable(row)}
+    if not workers:
+        return 0
+    # A worker-month lives in one tier at a time; fold partly restored months back together
+    restore_archived((worker_id, month) for worker_id in workers)
+
+    by_worker = defaultdict(list)
+    kept = []
+    for row in _month_rows(month, workers):
+        if packable(row):
+            by_worker[row['worker_id']].append(row)
+        else:
+            kept.append(row)
+
+    records = [pack_month(worker_id, month, rows) for worker_id, rows in by_worker.items()]
+    for start in range(0, len(records), INSERT_CHUNK):
+        db.session.execute(insert(AttendanceArchive), records[start:start + INSERT_CHUNK])
+    packed = [row['id'] for rows in by_worker.values() for row in rows]
+    for start in range(0, len(packed), INSERT_CHUNK):
+        db.session.execute(delete(Attendance.__table__).where(
+            Attendance.__table__.c.id.in_(packed[start:start + INSERT_CHUNK])
+        ))
+
+    # Packing canonicalizes legacy spellings ('Present ') the raw rollup did not count
+    from services.attendance_monthly import refresh_attendance_monthly
+    refresh_attendance_monthly((worker_id, month) for worker_id in by_worker)
+
+    if kept:
+        logging.warning(f"Left {len(kept)} attendance rows for {month} uncompacted: unknown status "
+                        f"{sorted({row['status'] for row in kept})}")
+    logging.info(f"Compacted attendance for {month}: {len(packed)} rows into {len(records)} records")
+    return len(records)
+
+
+def closed_months():
+    """Months before the current one whose payroll is locked and that still have attendance rows."""
+    current = date.today().strftime('%Y-%m')
+    locked = [m[0] for m in db.session.query(PayrollLock.month).filter(PayrollLock.month < current).all()]
+    return sorted(
+        month for month in locked
+        if db.session.query(Attendance.id).filter(in_month(month)).limit(1).first()
+    )
+
+
+def compact_closed_months():
+    """Compact every closed month that still has attendance rows, committing per month."""
+    compacted = []
+    for month in closed_months():
+        packed = compact_month(month)
+        db.session.commit()
+        if packed:
+            compacted.append(month)
+    return compacted
+
+
+def schedule_compaction(app):
+    """Compact closed months in a background thread (after a payroll period is locked)."""
+    def run():
+        with app.app_context():
+            try:
+                compact_closed_months()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Attendance compaction failed: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,323 @@
+from extensions import db
+from models import Worker, Attendance
+from services.attendance import upsert_attendance, note_attendance_months
+from services.attendance_queries import canonical_status
+from services.attendance_monthly import refresh_attendance_monthly
+from services.attendance_archive import archived_rows, restore_archived
+from services.payroll_dirty import mark_dirty
+from datetime import date, datetime, time as dtime
+from functools import lru_cache
+import csv
+import io
+import logging
+import time
+
+# Rows validated, compared against stored rows and written per round trip
+IMPORT_BATCH = 2000
+# Errors and conflicts listed in the response; the counts always cover the whole file
+MAX_REPORTED = 200
+
+# Accepted header spellings (lower-cased, spaces as underscores) for each column
+COLUMN_ALIASES = {
+    'worker_code': ('worker_code', 'code', 'staff_id', 'staff_code', 'employee_id', 'employee_code', 'badge'),
+    'date': ('date', 'day', 'attendance_date'),
+    'status': ('status', 'attendance'),
+    'time_in': ('time_in', 'clock_in', 'check_in', 'in'),
+    'time_out': ('time_out', 'clock_out', 'check_out', 'out'),
+    'notes': ('notes', 'note', 'remarks', 'comment'),
+}
+REQUIRED_COLUMNS = ('worker_code', 'date')
+
+DATE_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y', '%Y/%m/%d', '%d %b %Y')
+TIME_FORMATS = ('%I:%M %p', '%I:%M:%S %p', '%I:%M%p', '%H.%M')
+
+
+class AttendanceImportError(Exception):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _parse_date_text(text):
+    try:
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised date {text!r}")
+
+
+@lru_cache(maxsize=4096)
+def _parse_time_text(text):
+    try:
+        return dtime.fromisoformat(text).replace(microsecond=0)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text.upper(), fmt).time()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognised time {text!r}")
+
+
+def _to_date(value):
+    # openpyxl hands back datetimes for date cells; CSV gives text
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value is None or str(value).strip() == '':
+        raise ValueError("date is required")
+    return _parse_date_text(str(value).strip())
+
+
+def _to_time(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value.time().replace(microsecond=0)
+    if isinstance(value, dtime):
+        return value.replace(microsecond=0)
+    if isinstance(value, (int, float)):
+        # An unformatted Excel time is a fraction of a day
+        seconds = round(value * 86400) % 86400
+        return dtime(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    text = str(value).strip()
+    return _parse_time_text(text) if text else None
+
+
+def _to_code(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().upper() if value is not None else ''
+
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(stream):
+    from openpyxl import load_workbook
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise AttendanceImportError(f"Could not open workbook: {e}")
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_sheet(stream, filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension == 'csv':
+        return _iter_csv(stream)
+    if extension in ('xlsx', 'xlsm'):
+        return _iter_xlsx(stream)
+    raise AttendanceImportError("Upload a .csv or .xlsx file")
+
+
+def _column_map(header):
+    """Map each known column to its index in the header row."""
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    columns = {}
+    for index, cell in enumerate(header):
+        name = str(cell or '').strip().lower().replace(' ', '_').replace('-', '_')
+        column = lookup.get(name)
+        if column and column not in columns:
+            columns[column] = index
+    missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+    if missing:
+        raise AttendanceImportError(f"Missing column(s): {', '.join(missing)}")
+    if 'status' not in columns and 'time_in' not in columns:
+        raise AttendanceImportError("The sheet needs a status or a time_in column")
+    return columns
+
+
+def _row_summary(status, time_in, time_out, notes):
+    return {
+        'status': status,
+        'time_in': time_in.strftime('%H:%M') if time_in else None,
+        'time_out': time_out.strftime('%H:%M') if time_out else None,
+        'notes': notes or ''
+    }
+
+
+def import_attendance(stream, filename, dry_run=False):
+    """
+    Stream attendance rows from a CSV or XLSX upload and bulk-upsert them in
+    the caller's transaction. Columns: worker_code, date, status, time_in,
+    time_out, notes (see COLUMN_ALIASES); a row without a status but with a
+    time_in counts as Present.
+
+    Rows that match what is already stored are skipped. A worker-day repeated
+    in the file is reported as a duplicate and the later row wins; a row that
+    would replace different stored values is reported as an overwrite. With
+    ``dry_run`` nothing is written and the same report is returned.
+    """
+    started = time.perf_counter()
+    rows = _iter_sheet(stream, filename)
+
+    columns = None
+    for line, header in enumerate(rows, start=1):
+        if any(cell not in (None, '') for cell in header):
+            columns = _column_map(header)
+            break
+    if columns is None:
+        raise AttendanceImportError("The file is empty")
+
+    # One lookup for every worker code instead of one per row
+    codes = {_to_code(code): worker_id for code, worker_id in
+             db.session.query(Worker.worker_code, Worker.id).filter(Worker.worker_code.isnot(None)).all()}
+
+    summary = {
+        'dry_run': dry_run, 'rows': 0, 'saved': 0, 'updated': 0, 'unchanged': 0,
+        'failed': 0, 'duplicates': 0, 'errors': [], 'conflicts': []
+    }
+    seen = set()
+    touched = set()
+    batch = {}
+    # Worker-days of this batch already applied by an earlier one; counted only as duplicates
+    repeats = set()
+
+    def cell(values, column):
+        index = columns.get(column)
+        return values[index] if index is not None and index < len(values) else None
+
+    for line, values in enumerate(rows, start=line + 1):
+        if not values or all(v in (None, '') for v in values):
+            continue
+        summary['rows'] += 1
+        code = _to_code(cell(values, 'worker_code'))
+        try:
+            worker_id = codes.get(code)
+            if not worker_id:
+                raise ValueError(f"unknown worker code {code!r}" if code else "worker_code is required")
+            day = _to_date(cell(values, 'date'))
+            time_in = _to_time(cell(values, 'time_in'))
+            time_out = _to_time(cell(values, 'time_out'))
+            raw_status = cell(values, 'status')
+            if raw_status in (None, '') and time_in:
+                raw_status = 'Present'
+            status = canonical_status(str(raw_status) if raw_status is not None else '')
+        except ValueError as e:
+            summary['failed'] += 1
+            if len(summary['errors']) < MAX_REPORTED:
+                summary['errors'].append({'line': line, 'worker_code': code, 'error': str(e)})
+            continue
+
+        notes = str(cell(values, 'notes') or '').strip()[:100]
+        key = worker_id * 1_000_000 + day.toordinal()
+        if key in seen:
+            summary['duplicates'] += 1
+            _report_conflict(summary, line, code, day, 'duplicate', None, (status, time_in, time_out, notes))
+            if (worker_id, day) not in batch:
+                repeats.add((worker_id, day))
+        seen.add(key)
+        batch[(worker_id, day)] = (line, code, {
+            'worker_id': worker_id,
+            'date': day,
+            'status': status,
+            'time_in': time_in,
+            'time_out': time_out,
+            'notes': notes
+        })
+        if len(batch) >= IMPORT_BATCH:
+            _apply_batch(batch, summary, touched, dry_run, repeats)
+            batch = {}
+            repeats = set()
+
+    _apply_batch(batch, summary, touched, dry_run, repeats)
+
+    if touched:
+        note_attendance_months(month for _, month in touched)
+        db.session.flush()
+        touched = sorted(touched)
+        refresh_attendance_monthly(touched)
+        for start in range(0, len(touched), IMPORT_BATCH // 2):
+            mark_dirty(touched[start:start + IMPORT_BATCH // 2])
+
+    summary['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    logging.info(
+        f"Attendance import {filename!r}{' (dry run)' if dry_run else ''}: {summary['rows']} rows, "
+        f"{summary['saved']} new, {summary['updated']} updated, {summary['failed']} failed "
+        f"in {summary['elapsed_ms']} ms"
+    )
+    return summary
+
+
+def _report_conflict(summary, line, code, day, kind, stored, imported):
+    if len(summary['conflicts']) >= MAX_REPORTED:
+        return
+    summary['conflicts'].append({
+        'line': line,
+        'worker_code': code,
+        'date': day.isoformat(),
+        'type': kind,
+        'stored': _row_summary(*stored) if stored else None,
+        'imported': _row_summary(*imported)
+    })
+
+
+def _apply_batch(batch, summary, touched, dry_run, repeats=()):
+    """
+    Compare one batch against the stored rows with a single query and upsert
+    what changed. Rows in ``repeats`` replace a worker-day an earlier batch
+    already applied and counted: they are written (the later row wins) but
+    not counted again, and a dry run does not mistake them for new rows.
+    """
+    if not batch:
+        return
+
+    # Compacted months are edited as ordinary rows; a dry run reads them in place
+    if not dry_run:
+        restore_archived(batch)
+
+    # Sheets come sorted by day or by worker, so worker ids plus the date range
+    # narrow this to an index range; rows outside the batch are dropped below
+    dates = [day for _, day in batch]
+    stored = {
+        (a.worker_id, a.date): (a.status, a.time_in, a.time_out, a.notes or '')
+        for a in db.session.query(
+            Attendance.worker_id, Attendance.date, Attendance.status,
+            Attendance.time_in, Attendance.time_out, Attendance.notes
+        ).filter(
+            Attendance.worker_id.in_({worker_id for worker_id, _ in batch}),
+            Attendance.date >= min(dates),
+            Attendance.date <= max(dates)
+        ).all()
+        if (a.worker_id, a.date) in batch
+    }
+    if dry_run:
+        for pair, row in archived_rows(batch).items():
+            stored[pair] = (row['status'], row['time_in'], row['time_out'], row['notes'] or '')
+
+    changed = []
+    for pair, (line, code, row) in batch.items():
+        imported = (row['status'], row['time_in'], row['time_out'], row['notes'])
+        current = stored.get(pair)
+        if pair in repeats:
+            if current != imported:
+                changed.append(row)
+            continue
+        if current is None:
+            summary['saved'] += 1
+        elif current == imported:
+            summary['unchanged'] += 1
+            continue
+        else:
+            summary['updated'] += 1
+            _report_conflict(summary, line, code, row['date'], 'overwrite', current, imported)
+        changed.append(row)
+
+    if changed and not dry_run:
+        upsert_attendance(changed, existing=stored.keys())
+        touched.update((r['worker_id'], r['date'].replace(day=1)) for r in changed)
@@ -0,0 +1,124 @@
+from extensions import db
+from models import Attendance, AttendanceMonthly, AttendanceArchive
+from services.attendance_queries import in_month, hours_worked, month_key
+from services.attendance_archive import archive_totals
+from services.bulk import dialect_insert, supports_upsert
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, insert, delete, case
+import logging
+
+COUNTED = ('present', 'absent', 'late', 'leave', 'total_hours')
+
+
+def _status_count(status):
+    return func.coalesce(func.sum(case((Attendance.status == status, 1), else_=0)), 0)
+
+
+def refresh_attendance_monthly(pairs):
+    """
+    Recompute the rollup rows for (worker_id, date-or-YYYY-MM) pairs from the
+    raw attendance of just those workers and months. Runs one GROUP BY and
+    one upsert per month in the caller's transaction.
+    """
+    by_month = defaultdict(set)
+    for worker_id, when in pairs:
+        if worker_id and when:
+            by_month[month_key(when)].add(int(worker_id))
+
+    for month, worker_ids in by_month.items():
+        _refresh_month(month, worker_ids)
+
+
+def _refresh_month(month, worker_ids=None):
+    totals = db.session.query(
+        Attendance.worker_id,
+        _status_count('Present'),
+        _status_count('Absent'),
+        _status_count('Late'),
+        _status_count('Leave'),
+        func.coalesce(func.sum(hours_worked()), 0)
+    ).filter(in_month(month)).group_by(Attendance.worker_id)
+    if worker_ids is not None:
+        totals = totals.filter(Attendance.worker_id.in_(worker_ids))
+
+    now = datetime.utcnow()
+    rows = {}
+    for worker_id, present, absent, late, leave, hours in totals.all():
+        rows[worker_id] = {
+            'worker_id': worker_id, 'month': month, 'present': int(present), 'absent': int(absent),
+            'late': int(late), 'leave': int(leave), 'total_hours': float(hours), 'updated_at': now
+        }
+    # Compacted worker-months have no rows left to group; count their bitmaps instead
+    for archived in archive_totals(month, worker_ids):
+        row = rows.setdefault(archived['worker_id'], {**archived, 'present': 0, 'absent': 0,
+                                                      'late': 0, 'leave': 0, 'total_hours': 0.0})
+        for column in COUNTED:
+            row[column] += archived[column]
+
+    stale = delete(AttendanceMonthly).where(AttendanceMonthly.month == month)
+    if worker_ids is not None:
+        stale = stale.where(AttendanceMonthly.worker_id.in_(worker_ids))
+
+    if not supports_upsert():
+        db.session.execute(stale)
+        if rows:
+            db.session.execute(insert(AttendanceMonthly), list(rows.values()))
+        return
+
+    # Overwrite each worker-month in place, so concurrent marks for the same
+    # worker never race a DELETE + INSERT onto the unique key
+    if rows:
+        stmt = dialect_insert(AttendanceMonthly)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['worker_id', 'month'],
+            set_={column: stmt.excluded[column] for column in (*COUNTED, 'updated_at')}
+        )
+        db.session.execute(stmt, list(rows.values()))
+    # Worker-months whose last attendance row was removed
+    db.session.execute(stale.where(AttendanceMonthly.worker_id.notin_(list(rows))))
+
+
+def rebuild_attendance_monthly(month=None):
+    """Rebuild the rollup from scratch, for one YYYY-MM or for every month with attendance."""
+    if month:
+        months = [month]
+    else:
+        db.session.execute(delete(AttendanceMonthly))
+        first, last = db.session.query(func.min(Attendance.date), func.max(Attendance.date)).one()
+        months = []
+        if first:
+            y, m = first.year, first.month
+            while (y, m) <= (last.year, last.month):
+                months.append(f'{y:04d}-{m:02d}')
+                y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+        archived = {m[0] for m in db.session.query(AttendanceArchive.month).distinct().all()}
+        months = sorted(set(months) | archived)
+
+    for period in months:
+        _refresh_month(period)
+    logging.info(f"Attendance monthly rollup rebuilt for {len(months)} month(s)")
+    return len(months)
+
+
+def month_totals(month, worker_ids=None):
+    """Present/absent/late/leave/hours summed over all workers (or a subset) for one month."""
+    query = db.session.query(
+        func.coalesce(func.sum(AttendanceMonthly.present), 0),
+        func.coalesce(func.sum(AttendanceMonthly.absent), 0),
+        func.coalesce(func.sum(AttendanceMonthly.late), 0),
+        func.coalesce(func.sum(AttendanceMonthly.leave), 0),
+        func.coalesce(func.sum(AttendanceMonthly.total_hours), 0),
+        func.count(AttendanceMonthly.id)
+    ).filter(AttendanceMonthly.month == month)
+    if worker_ids is not None:
+        query = query.filter(AttendanceMonthly.worker_id.in_(worker_ids))
+    present, absent, late, leave, hours, workers = query.one()
+    return {
+        'present': int(present),
+        'absent': int(absent),
+        'late': int(late),
+        'leave': int(leave),
+        'total_hours': round(float(hours), 2),
+        'workers': int(workers)
+    }
@@ -0,0 +1,96 @@
+from extensions import db
+from models import Attendance
+from datetime import date, datetime
+from sqlalchemy import func, case, cast, Date
+
+# The only status values stored on attendance rows; writes are canonicalized to these
+STATUSES = ('Present', 'Absent', 'Late', 'Leave')
+
+# Hours beyond this in one day count as overtime
+STANDARD_SHIFT_HOURS = 8
+
+# Accepted spellings (lower-cased) for each canonical status
+STATUS_ALIASES = {
+    'present': 'Present',
+    'p': 'Present',
+    'absent': 'Absent',
+    'a': 'Absent',
+    'late': 'Late',
+    'leave': 'Leave',
+}
+# Shorthands that could mean more than one status ('L' is Late on some sheets, Leave on others)
+AMBIGUOUS_STATUSES = {
+    'l': ('Late', 'Leave'),
+}
+
+
+def canonical_status(value):
+    """Map a submitted status onto one of STATUSES. Raises ValueError for anything else."""
+    key = (value or '').strip().lower()
+    if key in AMBIGUOUS_STATUSES:
+        raise ValueError(f"ambiguous attendance status {value!r}: spell out "
+                         f"{' or '.join(AMBIGUOUS_STATUSES[key])}")
+    status = STATUS_ALIASES.get(key)
+    if not status:
+        raise ValueError(f"unknown attendance status {value!r}")
+    return status
+
+
+def month_bounds(period):
+    """Return the half-open [start, end) date range for a YYYY-MM period."""
+    year, month = map(int, period.split('-'))
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+
+def month_key(value):
+    """The YYYY-MM period of a date, datetime or 'YYYY-MM[-DD]' string."""
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    return str(value)[:7]
+
+
+def label_to_period(label):
+    """Turn a "September 2026" dropdown label into "2026-09". Raises ValueError if malformed."""
+    return datetime.strptime(label, "%B %Y").strftime('%Y-%m')
+
+
+def in_month(period, column=Attendance.date):
+    """
+    Range predicate for a YYYY-MM period on a date column. Unlike
+    extract('month') == m, this can use the date and covering indexes.
+    """
+    start, end = month_bounds(period)
+    return (column >= start) & (column < end)
+
+
+def hours_worked(time_in=Attendance.time_in, time_out=Attendance.time_out):
+    """
+    SQL expression for hours between time_in and time_out. A time_out earlier
+    than time_in is an overnight shift, as in Attendance.duration. NULL when
+    either time is missing.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        seconds = func.extract('epoch', time_out - time_in)
+    else:
+        # julianday() works in fractional days; round back to whole seconds
+        seconds = func.round((func.julianday(time_out) - func.julianday(time_in)) * 86400)
+    seconds = case((seconds < 0, seconds + 86400), else_=seconds)
+    return case(
+        (time_in.is_(None) | time_out.is_(None), None),
+        else_=seconds / 3600.0
+    )
+
+
+def overtime_hours(hours=None):
+    """SQL expression for hours past STANDARD_SHIFT_HOURS on one attendance row."""
+    hours = hours_worked() if hours is None else hours
+    return case((hours > STANDARD_SHIFT_HOURS, hours - STANDARD_SHIFT_HOURS), else_=0)
+
+
+def week_start(column=Attendance.date):
+    """SQL expression for the Monday of the week containing a date."""
+    if db.engine.dialect.name == 'postgresql':
+        return cast(func.date_trunc('week', column), Date)
+    return func.date(column, 'weekday 0', '-6 days')
@@ -0,0 +1,86 @@
+from extensions import db
+from models import Worker, Attendance
+from services.attendance_queries import hours_worked, overtime_hours, week_start, month_bounds
+from services.attendance_archive import compacted_months
+from sqlalchemy import func, case
+import time
+
+# Dimensions a report can be grouped by, in the order they appear in each row
+GROUPINGS = ('department', 'week', 'worker')
+
+
+class ReportError(Exception):
+    pass
+
+
+def hours_report(start, end, group_by=('worker',)):
+    """
+    Hours worked, overtime and late arrivals over the half-open [start, end)
+    date range, aggregated in one query by any of ``department``, ``week``
+    (Monday start) and ``worker``. Nothing is computed per row in Python.
+    Months moved to the compact archive are not included; they are listed
+    under ``compacted_months`` so callers can tell the figures are partial.
+    """
+    group_by = [g for g in GROUPINGS if g in set(group_by)]
+    if not group_by:
+        raise ReportError(f"group_by must include one of {', '.join(GROUPINGS)}")
+    if end <= start:
+        raise ReportError("end must be after start")
+
+    started = time.perf_counter()
+    hours = hours_worked()
+    dimensions = []
+    if 'department' in group_by:
+        dimensions.append(func.coalesce(Worker.department, '').label('department'))
+    if 'week' in group_by:
+        dimensions.append(week_start().label('week'))
+    if 'worker' in group_by:
+        dimensions += [
+            Attendance.worker_id.label('worker_id'),
+            Worker.worker_code.label('worker_code'),
+            Worker.name.label('name')
+        ]
+
+    query = db.session.query(
+        *dimensions,
+        func.count(Attendance.id).label('days'),
+        func.count(func.distinct(Attendance.worker_id)).label('workers'),
+        func.coalesce(func.sum(hours), 0).label('hours'),
+        func.coalesce(func.sum(overtime_hours(hours)), 0).label('overtime'),
+        func.coalesce(func.sum(case((Attendance.status == 'Late', 1), else_=0)), 0).label('late'),
+        func.count(hours).label('timed_days')
+    ).join(Worker, Attendance.worker_id == Worker.id).filter(
+        Attendance.date >= start,
+        Attendance.date < end
+    ).group_by(*dimensions).order_by(*dimensions)
+
+    rows = []
+    for r in query.all():
+        row = {}
+        if 'department' in group_by:
+            row['department'] = r.department or 'Unassigned'
+        if 'week' in group_by:
+            row['week'] = str(r.week)
+        if 'worker' in group_by:
+            row.update(worker_id=r.worker_id, worker_code=r.worker_code, name=r.name)
+        row.update(
+            days=int(r.days),
+            workers=int(r.workers),
+            hours=round(float(r.hours), 2),
+            overtime=round(float(r.overtime), 2),
+            late=int(r.late),
+            avg_hours=round(float(r.hours) / r.timed_days, 2) if r.timed_days else 0
+        )
+        rows.append(row)
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'rows': rows,
+        'compacted_months': sorted(
+            m for m in compacted_months()
+            if month_bounds(m)[0] < end and month_bounds(m)[1] > start
+        ),
+        'query_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,57 @@
+from extensions import db
+from models import Worker, Attendance
+from services.attendance_queries import STATUSES
+from sqlalchemy import func, and_, select
+import hashlib
+
+
+def day_statistics(day):
+    """
+    Attendance counts for one day per status and department, from a single
+    GROUP BY over active workers left-joined to that day's attendance.
+    Workers without a row count as not marked.
+    """
+    department = func.coalesce(Worker.department, '')
+    rows = db.session.query(
+        department,
+        Attendance.status,
+        func.count(Worker.id)
+    ).outerjoin(Attendance, and_(Attendance.worker_id == Worker.id, Attendance.date == day))\
+     .filter(Worker.is_active == True)\
+     .group_by(department, Attendance.status).all()
+
+    def empty():
+        counts = {status: 0 for status in STATUSES}
+        counts.update(not_marked=0, total=0)
+        return counts
+
+    totals = empty()
+    departments = {}
+    for dept, status, count in rows:
+        key = status if status in STATUSES else 'not_marked'
+        bucket = departments.setdefault(dept or 'Unassigned', empty())
+        for counts in (bucket, totals):
+            counts[key] += count
+            counts['total'] += count
+
+    totals['marked'] = totals['total'] - totals['not_marked']
+    return {
+        'date': day.isoformat(),
+        'totals': totals,
+        'departments': dict(sorted(departments.items()))
+    }
+
+
+def day_statistics_etag(day):
+    """
+    Cheap validator for day_statistics(): changes whenever that day's
+    attendance or the set of active workers changes.
+    """
+    state = db.session.execute(select(
+        select(func.max(Attendance.updated_at)).where(Attendance.date == day).scalar_subquery(),
+        select(func.count(Attendance.id)).where(Attendance.date == day).scalar_subquery(),
+        select(func.max(Worker.updated_at)).where(Worker.is_active == True).scalar_subquery(),
+        select(func.count(Worker.id)).where(Worker.is_active == True).scalar_subquery()
+    )).one()
+    raw = f"{day.isoformat()}|" + "|".join(str(v) for v in state)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
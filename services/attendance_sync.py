@@ -0,0 +1,186 @@
+from extensions import db
+from models import Worker, Attendance, AttendanceSyncKey
+from services.attendance import parse_time, upsert_attendance, note_attendance_months
+from services.attendance_queries import canonical_status
+from services.attendance_monthly import refresh_attendance_monthly
+from services.attendance_archive import restore_archived
+from services.payroll_dirty import mark_dirty
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import insert, or_, and_, tuple_
+
+MAX_SYNC_CHANGES = 500
+# Keys are kept long enough to cover a phone that stays offline for a few days
+KEY_RETENTION = timedelta(days=7)
+# Client clocks ahead of the server are clamped so they cannot win every later conflict
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+
+class SyncError(Exception):
+    pass
+
+
+def _parse_stamp(value, now):
+    stamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if stamp.tzinfo:
+        stamp = stamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(stamp, now + MAX_CLOCK_SKEW)
+
+
+def row_to_dict(att):
+    return {
+        'id': att.id,
+        'worker_id': att.worker_id,
+        'date': att.date.isoformat(),
+        'status': att.status,
+        'time_in': att.time_in.strftime('%H:%M') if att.time_in else None,
+        'time_out': att.time_out.strftime('%H:%M') if att.time_out else None,
+        'notes': att.notes or '',
+        'updated_at': att.updated_at.isoformat() if att.updated_at else None
+    }
+
+
+def _parse_change(item, now):
+    key = str(item.get('key') or '').strip()
+    if not key or len(key) > 64:
+        raise ValueError("key is required (at most 64 characters)")
+    if not item.get('worker_id') or not item.get('status'):
+        raise ValueError("worker_id and status are required")
+    if not item.get('updated_at'):
+        raise ValueError("updated_at is required")
+
+    return key, {
+        'worker_id': int(item['worker_id']),
+        'date': date.fromisoformat(item['date']) if item.get('date') else date.today(),
+        'status': canonical_status(item['status']),
+        'time_in': parse_time(item.get('time_in')),
+        'time_out': parse_time(item.get('time_out')),
+        'notes': (item.get('notes') or '').strip()[:100],
+        'updated_at': _parse_stamp(item['updated_at'], now)
+    }
+
+
+def apply_attendance_sync(changes, since=None):
+    """
+    Apply a batch of attendance deltas from an offline client in the caller's
+    transaction. Each change carries a client-generated ``key``; keys already
+    seen are acknowledged without being applied again. A change only replaces
+    the stored row when its ``updated_at`` is newer (last writer wins).
+
+    Returns per-key results plus the server rows the client should adopt:
+    every row this batch touched, and rows changed since ``since`` on the
+    batch's dates.
+    """
+    if not isinstance(changes, list):
+        raise SyncError("changes must be a list")
+    if len(changes) > MAX_SYNC_CHANGES:
+        raise SyncError(f"At most {MAX_SYNC_CHANGES} changes per batch")
+
+    now = datetime.utcnow()
+    since_at = None
+    if since:
+        try:
+            since_at = _parse_stamp(since, now)
+        except (TypeError, ValueError):
+            raise SyncError("since must be an ISO timestamp")
+
+    AttendanceSyncKey.query.filter(AttendanceSyncKey.created_at < now - KEY_RETENTION).delete()
+
+    results = []
+    parsed = []
+    for item in changes:
+        result = {'key': item.get('key') if isinstance(item, dict) else None}
+        results.append(result)
+        try:
+            key, row = _parse_change(item, now)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            result.update(result='failed', error=str(e))
+            continue
+        result['key'] = key
+        parsed.append((result, key, row))
+
+    # Retries: keys recorded by an earlier request, or repeated within this batch
+    keys = [key for _, key, _ in parsed]
+    seen = {k[0] for k in db.session.query(AttendanceSyncKey.key).filter(AttendanceSyncKey.key.in_(keys)).all()} \
+        if keys else set()
+    latest = {}
+    for result, key, row in parsed:
+        if key in seen:
+            result['result'] = 'duplicate'
+            continue
+        seen.add(key)
+        pair = (row['worker_id'], row['date'])
+        # Several changes to the same worker-day: only the newest can win
+        previous = latest.get(pair)
+        if previous and previous[2]['updated_at'] >= row['updated_at']:
+            result['result'] = 'stale'
+            continue
+        if previous:
+            previous[0]['result'] = 'stale'
+        latest[pair] = (result, key, row)
+
+    known = {w[0] for w in db.session.query(Worker.id).filter(
+        Worker.id.in_({pair[0] for pair in latest})).all()} if latest else set()
+    stored = {}
+    if latest:
+        # Last-writer-wins needs the stored rows, including ones in compacted months
+        restore_archived(latest.keys())
+        stored = {
+            (a.worker_id, a.date): a.updated_at for a in db.session.query(
+                Attendance.worker_id, Attendance.date, Attendance.updated_at
+            ).filter(
+                Attendance.worker_id.in_({pair[0] for pair in latest}),
+                Attendance.date.in_({pair[1] for pair in latest})
+            ).all()
+        }
+
+    winners = []
+    for pair, (result, key, row) in latest.items():
+        if pair[0] not in known:
+            result.update(result='failed', error='worker not found')
+        elif pair in stored and stored[pair] and stored[pair] >= row['updated_at']:
+            result['result'] = 'stale'
+        else:
+            result['result'] = 'applied'
+            winners.append(row)
+
+    # The compacted months were restored and the stored rows read above
+    upsert_attendance(winners, newer_only=True, existing=stored.keys())
+    if winners:
+        note_attendance_months(r['date'] for r in winners)
+        db.session.flush()
+        touched = [(r['worker_id'], r['date']) for r in winners]
+        refresh_attendance_monthly(touched)
+        mark_dirty(touched)
+
+    # Remember applied and stale keys so a retried request is a no-op
+    records = [{'key': key, 'worker_id': row['worker_id'], 'date': row['date'], 'result': result['result'],
+                'created_at': now}
+               for result, key, row in parsed if result.get('result') in ('applied', 'stale')]
+    if records:
+        db.session.execute(insert(AttendanceSyncKey), records)
+
+    rows = _changed_rows(latest.keys(), since_at)
+    counts = {'applied': 0, 'duplicate': 0, 'stale': 0, 'failed': 0}
+    for r in results:
+        counts[r['result']] += 1
+
+    return {
+        'applied': counts['applied'],
+        'duplicates': counts['duplicate'],
+        'stale': counts['stale'],
+        'failed': counts['failed'],
+        'results': results,
+        'rows': rows,
+        'server_time': now.isoformat()
+    }
+
+
+def _changed_rows(pairs, since_at):
+    pairs = list(pairs)
+    criteria = [tuple_(Attendance.worker_id, Attendance.date).in_(pairs)] if pairs else []
+    if since_at:
+        dates = {d for _, d in pairs} | {date.today()}
+        criteria.append(and_(Attendance.date.in_(dates), Attendance.updated_at > since_at))
+    if not criteria:
+        return []
+    return [row_to_dict(a) for a in Attendance.query.filter(or_(*criteria)).order_by(Attendance.id).all()]
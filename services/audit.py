@@ -0,0 +1,47 @@
+from models import AuditLog
+from utils import encode_cursor, decode_cursor
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def audit_page(period=None, entity_key=None, worker_id=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of audit entries, newest first, using keyset pagination on
+    (created_at, id). Pass the returned next_cursor back to get the following page.
+    """
+    limit = max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+    query = AuditLog.query
+
+    if period:
+        query = query.filter(AuditLog.period == period)
+    if entity_key:
+        query = query.filter(AuditLog.entity_key == entity_key)
+    if worker_id:
+        query = query.filter(AuditLog.worker_id == worker_id)
+
+    position = decode_cursor(cursor)
+    if position:
+        try:
+            after_at = datetime.fromisoformat(position['created_at'])
+            after_id = int(position['id'])
+        except (KeyError, TypeError, ValueError):
+            position = None
+        else:
+            query = query.filter(or_(
+                AuditLog.created_at < after_at,
+                and_(AuditLog.created_at == after_at, AuditLog.id < after_id)
+            ))
+
+    entries = query.order_by(AuditLog.created_at.desc(), AuditLog.id.desc()).limit(limit + 1).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    next_cursor = None
+    if has_more and entries:
+        last = entries[-1]
+        next_cursor = encode_cursor({'created_at': last.created_at.isoformat(), 'id': last.id})
+
+    return entries, next_cursor
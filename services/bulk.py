@@ -0,0 +1,21 @@
+from extensions import db
+from sqlalchemy import insert
+
+
+def dialect_insert(model):
+    """
+    An INSERT for the bound database that supports on_conflict_do_update /
+    on_conflict_do_nothing (PostgreSQL and SQLite). Falls back to a plain insert.
+    """
+    name = db.engine.dialect.name
+    if name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert(model)
+    if name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model)
+    return insert(model)
+
+
+def supports_upsert():
+    return db.engine.dialect.name in ('postgresql', 'sqlite')
@@ -0,0 +1,413 @@
+from extensions import db
+from models import Worker
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, or_, and_
+import hashlib
+import logging
+import os
+import re
+import shutil
+import threading
+import uuid
+
+CLOUDINARY_FOLDER = 'okoya_passports'
+CLOUDINARY_TRANSFORMATION = [{"width": 500, "height": 500, "crop": "fill"}]
+# Square thumbnails made at upload time, sized for where they are shown (about 2x the CSS size)
+PASSPORT_VARIANTS = {
+    'list': 96,
+    'card': 240,
+    'profile': 360,
+}
+# Failed uploads are retried after 2, 4, 8... seconds, without holding an upload slot
+RETRY_BASE_SECONDS = 2
+# Statuses whose staged file is still the worker's photo
+IN_FLIGHT = ('pending', 'uploading')
+
+_executor = None
+_executor_lock = threading.Lock()
+# Staged paths queued, uploading or waiting to retry; a path is never queued twice
+_queued = set()
+_queued_changed = threading.Condition()
+
+
+def _variant_transformation(size):
+    return {"width": size, "height": size, "crop": "fill"}
+
+
+class CloudinaryBackend:
+    """
+    Uploads to Cloudinary; worker.passport holds the secure URL. The URL
+    carries the asset version, so it changes whenever the photo does.
+    """
+
+    def upload(self, path, name):
+        import cloudinary.uploader
+        result = cloudinary.uploader.upload(
+            path,
+            folder=CLOUDINARY_FOLDER,
+            public_id=name,
+            overwrite=True,
+            transformation=CLOUDINARY_TRANSFORMATION,
+            # Thumbnails are derived now rather than on the first page view
+            eager=[_variant_transformation(size) for size in PASSPORT_VARIANTS.values()],
+            resource_type="image"
+        )
+        return result['secure_url']
+
+    def owns(self, url):
+        return 'cloudinary.com' in url
+
+    def versioned(self, url):
+        return re.search(r'/upload/(.+/)?v\d+/', url) is not None
+
+    def variant_url(self, url, variant):
+        # Same transformation string as the eager derivative, so it is served from the CDN
+        size = PASSPORT_VARIANTS[variant]
+        return url.replace('/upload/', f'/upload/c_fill,h_{size},w_{size}/', 1)
+
+    def delete(self, url):
+        import cloudinary.uploader
+        # .../upload/v1712345678/okoya_passports/abc.jpg -> okoya_passports/abc
+        public_id = re.sub(r'^v\d+/', '', url.split('/upload/')[1]).rsplit('.', 1)[0]
+        cloudinary.uploader.destroy(public_id)
+
+
+class LocalBackend:
+    """Copies passports under the static folder; a stand-in for Cloudinary in development and tests."""
+
+    def __init__(self, root, url_prefix):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def upload(self, path, name):
+        os.makedirs(self.root, exist_ok=True)
+        filename = name + os.path.splitext(path)[1]
+        shutil.copyfile(path, os.path.join(self.root, filename))
+        self._make_variants(path, filename)
+        return f"{self.url_prefix}/{filename}"
+
+    def _make_variants(self, path, filename):
+        from PIL import Image, ImageOps
+        try:
+            with Image.open(path) as image:
+                for variant, size in PASSPORT_VARIANTS.items():
+                    thumbnail = ImageOps.fit(image, (size, size))
+                    if filename.lower().endswith(('.jpg', '.jpeg')) and thumbnail.mode != 'RGB':
+                        thumbnail = thumbnail.convert('RGB')
+                    thumbnail.save(os.path.join(self.root, self._variant_name(filename, variant)))
+        except Exception as e:
+            # Pages fall back to the full image
+            logging.warning(f"Could not make passport thumbnails for {filename}: {e}")
+
+    @staticmethod
+    def _variant_name(filename, variant):
+        stem, extension = os.path.splitext(filename)
+        return f"{stem}-{variant}{extension}"
+
+    def owns(self, url):
+        return url.startswith(self.url_prefix + '/')
+
+    def versioned(self, url):
+        # Files are named after their content hash (or a random id, for older uploads)
+        return True
+
+    def variant_url(self, url, variant):
+        filename = self._variant_name(url.rsplit('/', 1)[1], variant)
+        if not os.path.exists(os.path.join(self.root, filename)):
+            return url
+        return f"{self.url_prefix}/{filename}"
+
+    def delete(self, url):
+        filename = url.rsplit('/', 1)[1]
+        os.remove(os.path.join(self.root, filename))
+        for variant in PASSPORT_VARIANTS:
+            try:
+                os.remove(os.path.join(self.root, self._variant_name(filename, variant)))
+            except OSError:
+                pass
+
+
+def _local_backend(app):
+    folder = app.config.get('PASSPORT_LOCAL_DIR', 'static/uploads/passports')
+    return LocalBackend(os.path.join(app.root_path, folder), '/' + folder)
+
+
+# PASSPORT_BACKEND names one of these; tests or other deployments can register more
+BACKENDS = {
+    'cloudinary': lambda app: CloudinaryBackend(),
+    'local': _local_backend,
+}
+
+
+def get_backend(app, name=None):
+    name = name or app.config.get('PASSPORT_BACKEND', 'cloudinary')
+    cache = app.extensions.setdefault('passport_backends', {})
+    if name not in cache:
+        cache[name] = BACKENDS[name](app)
+    return cache[name]
+
+
+def _owning_backend(app, url):
+    """The backend that stored ``url``, which may not be the one currently configured."""
+    for name in BACKENDS:
+        backend = get_backend(app, name)
+        if backend.owns(url):
+            return backend
+    return None
+
+
+def passport_variant(app, url, variant=None):
+    """
+    The URL of a stored passport at one of PASSPORT_VARIANTS (the full image
+    when ``variant`` is None), and whether the URL already changes with the
+    photo's content. URLs no backend recognises are returned as they are.
+    """
+    backend = _owning_backend(app, url)
+    if not backend:
+        return url, False
+    return (backend.variant_url(url, variant) if variant else url), backend.versioned(url)
+
+
+def _content_hash(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def staging_dir(app):
+    path = app.config.get('PASSPORT_STAGING_DIR') or os.path.join(app.instance_path, 'passport_staging')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def stage_passport(file_storage, worker):
+    """
+    Save an uploaded passport to the local staging folder and mark the worker
+    pending. The worker must have an id. Call schedule_passport_upload() after
+    the commit; until then the staged file is the worker's photo.
+    """
+    extension = file_storage.filename.rsplit('.', 1)[1].lower()
+    path = os.path.join(staging_dir(current_app), f"{worker.id}-{uuid.uuid4().hex}.{extension}")
+    file_storage.save(path)
+    # A replaced file that is still uploading (here or in another process) is removed by its own job
+    previous = worker.passport_staged
+    if previous and previous not in _queued and worker.passport_status != 'uploading':
+        _remove_staged(previous)
+    worker.passport_staged = path
+    worker.passport_status = 'pending'
+    worker.passport_claimed_at = None
+    return path
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(1, app.config.get('PASSPORT_UPLOAD_CONCURRENCY', 2)),
+                thread_name_prefix='passport-upload'
+            )
+        return _executor
+
+
+def schedule_passport_upload(app, worker_id, path, attempt=0, include_failed=False):
+    """
+    Queue the upload of a staged passport; at most PASSPORT_UPLOAD_CONCURRENCY
+    run at once. Returns None if the path is already queued. The job claims
+    the row before uploading, so a path queued in several processes is
+    uploaded once; ``include_failed`` lets it claim a failed upload too.
+    """
+    with _queued_changed:
+        if path in _queued:
+            return None
+        _queued.add(path)
+    return _get_executor(app).submit(_upload_job, app, worker_id, path, attempt, include_failed)
+
+
+def _release(path):
+    with _queued_changed:
+        _queued.discard(path)
+        _queued_changed.notify_all()
+
+
+def _retry(app, worker_id, path, attempt):
+    _release(path)
+    schedule_passport_upload(app, worker_id, path, attempt)
+
+
+def wait_for_uploads(timeout=None):
+    """Block until every queued upload, including pending retries, has finished."""
+    with _queued_changed:
+        return _queued_changed.wait_for(lambda: not _queued, timeout)
+
+
+def schedule_passport_delete(app, url):
+    """Delete a stored passport in the background. Missing or foreign URLs are ignored."""
+    if url:
+        return _get_executor(app).submit(_delete_job, app, url)
+
+
+def _remove_staged(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _delete_job(app, url):
+    with app.app_context():
+        backend = _owning_backend(app, url)
+        if not backend:
+            return
+        try:
+            backend.delete(url)
+        except Exception as e:
+            logging.warning(f"Failed to delete passport {url}: {e}")
+
+
+def _upload_job(app, worker_id, path, attempt, include_failed=False):
+    retrying = False
+    try:
+        retrying = _attempt_upload(app, worker_id, path, attempt, include_failed)
+    finally:
+        if not retrying:
+            _release(path)
+
+
+def _claim(app, worker_id, path, include_failed=False, held=False):
+    """
+    Atomically mark a staged upload as taken by this process, so other
+    processes resuming the queue (every gunicorn worker and flask command
+    starts one) skip it. A claim older than PASSPORT_UPLOAD_CLAIM_SECONDS
+    is taken over. ``held`` renews a claim this process already has.
+    """
+    now = datetime.utcnow()
+    if held:
+        available = Worker.passport_status == 'uploading'
+    else:
+        stale = now - timedelta(seconds=app.config.get('PASSPORT_UPLOAD_CLAIM_SECONDS', 600))
+        statuses = ['pending', 'failed'] if include_failed else ['pending']
+        available = or_(
+            Worker.passport_status.in_(statuses),
+            and_(Worker.passport_status == 'uploading',
+                 or_(Worker.passport_claimed_at.is_(None), Worker.passport_claimed_at < stale))
+        )
+    try:
+        result = db.session.execute(
+            update(Worker)
+            .where(Worker.id == worker_id, Worker.passport_staged == path, available)
+            .values(passport_status='uploading', passport_claimed_at=now)
+        )
+        db.session.commit()
+        return result.rowcount > 0
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Could not claim passport upload for worker {worker_id}: {e}")
+        return False
+
+
+def _attempt_upload(app, worker_id, path, attempt, include_failed=False):
+    """One upload attempt. Returns True when a retry has been scheduled."""
+    with app.app_context():
+        if not _claim(app, worker_id, path, include_failed=include_failed, held=attempt > 0):
+            staged = db.session.query(Worker.passport_staged).filter_by(id=worker_id).scalar()
+            if staged != path:
+                # Replaced or deleted while queued; nobody else will want the file
+                _remove_staged(path)
+            return False
+
+        if not os.path.exists(path):
+            _finish(worker_id, path, status='failed')
+            logging.error(f"Staged passport for worker {worker_id} is missing: {path}")
+            return False
+
+        try:
+            # Named by content, so re-uploading the same photo gives the same URL
+            digest = _content_hash(path)
+            url = get_backend(app).upload(path, f"{worker_id}-{digest}")
+        except Exception as e:
+            retries = app.config.get('PASSPORT_UPLOAD_RETRIES', 3)
+            if attempt + 1 < retries:
+                delay = RETRY_BASE_SECONDS * 2 ** attempt
+                logging.warning(f"Passport upload for worker {worker_id} failed ({e}); retrying in {delay}s")
+                timer = threading.Timer(delay, _retry, args=(app, worker_id, path, attempt + 1))
+                timer.daemon = True
+                timer.start()
+                return True
+            _finish(worker_id, path, status='failed')
+            logging.error(f"Passport upload for worker {worker_id} failed after {retries} attempts: {e}")
+            return False
+
+        previous = db.session.query(Worker.passport).filter_by(id=worker_id).scalar()
+        if _finish(worker_id, path, passport=url):
+            if previous and previous != url:
+                _delete_job(app, previous)
+            logging.info(f"[PASSPORT UPLOADED] worker {worker_id}: {url}")
+        else:
+            # The worker was deleted, or a newer photo was staged while this one uploaded
+            _discard_unless_used(app, worker_id, url, digest)
+        _remove_staged(path)
+        return False
+
+
+def _discard_unless_used(app, worker_id, url, digest):
+    """
+    Delete an asset whose upload lost the race, unless the worker already
+    points at it or has staged the same photo again (the same content gives
+    the same asset, so deleting it would break the winner's URL).
+    """
+    current = db.session.query(Worker.passport, Worker.passport_staged).filter_by(id=worker_id).first()
+    if current:
+        if current.passport == url:
+            return
+        staged = current.passport_staged
+        if staged and os.path.exists(staged) and _content_hash(staged) == digest:
+            return
+    _delete_job(app, url)
+
+
+def _finish(worker_id, path, status=None, passport=None):
+    """
+    Record the outcome only if ``path`` is still the worker's staged file.
+    Returns False when a newer upload or a deletion got there first.
+    """
+    values = {'passport_status': status, 'passport_claimed_at': None}
+    if passport:
+        values.update(passport=passport, passport_staged=None, updated_at=datetime.utcnow())
+    try:
+        result = db.session.execute(
+            update(Worker)
+            .where(Worker.id == worker_id, Worker.passport_staged == path)
+            .values(**values)
+        )
+        db.session.commit()
+        return result.rowcount > 0
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Could not record passport upload for worker {worker_id}: {e}")
+        return False
+
+
+def resume_pending_uploads(app, include_failed=False):
+    """
+    Queue staged passports left pending or mid-upload (e.g. by a restart),
+    and optionally failed ones. Rows another process is uploading are
+    skipped when the job tries to claim them.
+    """
+    with app.app_context():
+        statuses = ['pending', 'uploading', 'failed'] if include_failed else ['pending', 'uploading']
+        try:
+            pending = db.session.query(Worker.id, Worker.passport_staged).filter(
+                Worker.passport_status.in_(statuses),
+                Worker.passport_staged.isnot(None)
+            ).all()
+        except Exception as e:
+            db.session.rollback()
+            logging.warning(f"Passport upload queue not resumed: {e}")
+            return 0
+        return sum(schedule_passport_upload(app, worker_id, path, include_failed=include_failed) is not None
+                   for worker_id, path in pending)
@@ -0,0 +1,166 @@
+from extensions import db
+from models import Worker, Salary, AttendanceMonthly
+from services.payroll_summary import salary_totals, add_to_totals, apply_summary_change
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import func, insert, update, literal
+from sqlalchemy.exc import IntegrityError
+import logging
+import time
+
+def days_present_by_worker(period, worker_ids=None):
+    """Present days per worker for a period, read from the attendance_monthly rollup."""
+    query = db.session.query(AttendanceMonthly.worker_id, AttendanceMonthly.present).filter(
+        AttendanceMonthly.month == period,
+        AttendanceMonthly.present > 0
+    )
+    if worker_ids is not None:
+        query = query.filter(AttendanceMonthly.worker_id.in_(worker_ids))
+    return dict(query.all())
+
+
+def build_salary_rows(period, workers, days_present):
+    """Build Salary insert rows using the auto_fill_from_worker()/calculate() rules."""
+    now = datetime.utcnow()
+    rows = []
+    for w in workers:
+        days = int(days_present.get(w.id, 0))
+        rate = Salary.rate_for_worker(w.daily_rate, w.amount_of_salary)
+        gross = float(days) * rate
+        rows.append({
+            'worker_id': w.id,
+            'month': period,
+            'total_days_present': days,
+            'daily_rate': rate,
+            'deductions': 0.0,
+            'gross_salary': gross,
+            'net_salary': gross,
+            'amount': gross,
+            'is_processed': False,
+            'bank_name': w.bank_name,
+            'bank_account': w.bank_account,
+            'bank_account_name': w.bank_account_name,
+            'payment_date': now
+        })
+    return rows
+
+
+def pending_workers(period, worker_ids=None):
+    """Active workers that have no Salary row for the period yet."""
+    existing = db.session.query(Salary.worker_id).filter(Salary.month == period)
+    query = db.session.query(
+        Worker.id,
+        Worker.department,
+        Worker.daily_rate,
+        Worker.amount_of_salary,
+        Worker.bank_name,
+        Worker.bank_account,
+        Worker.bank_account_name
+    ).filter(
+        Worker.is_active == True,
+        Worker.id.notin_(existing)
+    )
+    if worker_ids is not None:
+        query = query.filter(Worker.id.in_(worker_ids))
+    return query.order_by(Worker.id).all()
+
+
+def generate_payroll(period, worker_ids=None, commit=True):
+    """
+    Create missing Salary rows for a period.
+    Present days come from the attendance_monthly rollup and all rows are
+    written with a single bulk INSERT. Returns counts and timings.
+    """
+    started = time.perf_counter()
+
+    workers = pending_workers(period, worker_ids)
+    loaded = time.perf_counter()
+
+    days_present = days_present_by_worker(period, [w.id for w in workers] if worker_ids is not None else None)
+    counted = time.perf_counter()
+
+    rows = build_salary_rows(period, workers, days_present)
+    inserted = 0
+    if rows:
+        try:
+            # A savepoint, so losing the race undoes only this insert and not the caller's work
+            with db.session.begin_nested():
+                db.session.execute(insert(Salary), rows)
+                departments = {w.id: w.department for w in workers}
+                added = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+                for row in rows:
+                    add_to_totals(added, period, departments[row['worker_id']], False,
+                                  row['gross_salary'], row['deductions'], row['net_salary'])
+                apply_summary_change({}, added)
+            inserted = len(rows)
+        except IntegrityError:
+            # Another request generated this period first
+            logging.warning(f"Payroll generation for {period} raced with another run")
+        if commit:
+            db.session.commit()
+    finished = time.perf_counter()
+
+    stats = {
+        'period': period,
+        'workers': len(workers),
+        'inserted': inserted,
+        'load_ms': round((loaded - started) * 1000, 2),
+        'attendance_ms': round((counted - loaded) * 1000, 2),
+        'insert_ms': round((finished - counted) * 1000, 2),
+        'total_ms': round((finished - started) * 1000, 2)
+    }
+    logging.info(f"Payroll generated for {period}: {stats}")
+    return stats
+
+
+def _execute_salary_update(stmt):
+    """Run a Salary UPDATE and return the number of rows it changed, via RETURNING when supported."""
+    stmt = stmt.execution_options(synchronize_session=False)
+    if db.engine.dialect.update_returning:
+        return len(db.session.execute(stmt.returning(Salary.id)).all())
+    return db.session.execute(stmt).rowcount
+
+
+def apply_salary_updates(period, worker_ids, updates):
+    """
+    Apply bulk-update fields (daily_rate, deduction_percent, status) to a period's rows
+    with one UPDATE whose SET clause recomputes the calculate() columns in SQL.
+    """
+    if not worker_ids:
+        return 0
+
+    rate = literal(float(updates['daily_rate'])) if 'daily_rate' in updates else Salary.daily_rate
+    gross = Salary.total_days_present * rate
+    if 'deduction_percent' in updates:
+        deductions = gross * float(updates['deduction_percent']) / 100
+    else:
+        deductions = Salary.deductions
+    net = gross - deductions
+
+    values = {
+        Salary.daily_rate: rate,
+        Salary.deductions: deductions,
+        Salary.gross_salary: gross,
+        Salary.net_salary: net,
+        Salary.amount: net,
+        Salary.updated_at: func.now()
+    }
+    if 'status' in updates:
+        values[Salary.is_processed] = (updates['status'] == 'processed')
+
+    selected = (Salary.month == period, Salary.worker_id.in_([int(w) for w in worker_ids]))
+    ids, before = salary_totals(*selected, lock=True)
+    updated = _execute_salary_update(update(Salary).where(*selected).values(values))
+    apply_summary_change(before, salary_totals(ids=ids)[1])
+    return updated
+
+
+def process_salaries(period, worker_ids=None):
+    """Mark a period's pending rows as processed with one UPDATE."""
+    selected = [Salary.month == period, Salary.is_processed == False]
+    if worker_ids is not None:
+        selected.append(Salary.worker_id.in_(worker_ids))
+    ids, before = salary_totals(*selected, lock=True)
+    processed = _execute_salary_update(update(Salary).where(*selected).values(is_processed=True, updated_at=func.now()))
+    apply_summary_change(before, salary_totals(ids=ids)[1])
+    return processed
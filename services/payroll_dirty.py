@@ -0,0 +1,146 @@
+from extensions import db
+from models import Salary, PayrollLock, PayrollDirty
+from services.bulk import dialect_insert, supports_upsert
+from services.payroll import days_present_by_worker
+from services.payroll_summary import salary_totals, apply_summary_change
+from services.attendance_queries import month_key
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select, update, delete, bindparam
+import logging
+import threading
+import time
+
+# Wait this long after the first attendance change before recomputing,
+# so a burst of marks (e.g. the morning "Save All") is handled in one pass
+DEBOUNCE_SECONDS = 5
+BATCH_SIZE = 5000
+
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def mark_dirty(pairs):
+    """
+    Queue (worker_id, date-or-YYYY-MM) pairs whose salary rows need their
+    attendance-derived fields recomputed. Runs in the caller's transaction.
+    """
+    now = datetime.utcnow()
+    keys = {(int(worker_id), month_key(when)) for worker_id, when in pairs if worker_id and when}
+    if not keys:
+        return 0
+
+    rows = [{'worker_id': w, 'month': m, 'marked_at': now} for w, m in keys]
+    if supports_upsert():
+        stmt = dialect_insert(PayrollDirty).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['worker_id', 'month'],
+            set_={'marked_at': stmt.excluded.marked_at}
+        )
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            existing = PayrollDirty.query.filter_by(worker_id=row['worker_id'], month=row['month']).first()
+            if existing:
+                existing.marked_at = now
+            else:
+                db.session.add(PayrollDirty(**row))
+    return len(rows)
+
+
+def recompute_dirty(limit=BATCH_SIZE):
+    """
+    Refresh total_days_present and the derived amounts for queued (worker, month)
+    salary rows. Locked periods are never touched; their marks wait until unlock.
+    Processed rows keep the values the admin confirmed, so their marks are dropped.
+    """
+    started = time.perf_counter()
+    locked = select(PayrollLock.month)
+    marks = db.session.query(PayrollDirty.id, PayrollDirty.worker_id, PayrollDirty.month, PayrollDirty.marked_at)\
+        .filter(PayrollDirty.month.notin_(locked))\
+        .order_by(PayrollDirty.id)\
+        .limit(limit).all()
+
+    by_month = defaultdict(list)
+    for m in marks:
+        by_month[m.month].append(m.worker_id)
+
+    refreshed = 0
+    for month, worker_ids in by_month.items():
+        days = days_present_by_worker(month, worker_ids)
+        selected = (Salary.month == month, Salary.worker_id.in_(worker_ids), Salary.is_processed == False)
+        ids, before = salary_totals(*selected, lock=True)
+        salaries = db.session.query(Salary.id, Salary.worker_id, Salary.daily_rate, Salary.deductions)\
+            .filter(*selected).all()
+
+        updates = []
+        for s in salaries:
+            present = int(days.get(s.worker_id, 0))
+            gross = float(present) * float(s.daily_rate or 0)
+            net = gross - float(s.deductions or 0)
+            updates.append({
+                'id': s.id,
+                'total_days_present': present,
+                'gross_salary': gross,
+                'net_salary': net,
+                'amount': net
+            })
+
+        if updates:
+            db.session.execute(update(Salary), updates)
+            apply_summary_change(before, salary_totals(ids=ids)[1])
+            refreshed += len(updates)
+
+    # Only clear marks that were not re-marked while we worked
+    if marks:
+        table = PayrollDirty.__table__
+        db.session.execute(
+            delete(table).where(
+                table.c.id == bindparam('mark_id'),
+                table.c.marked_at == bindparam('mark_at')
+            ),
+            [{'mark_id': m.id, 'mark_at': m.marked_at} for m in marks]
+        )
+    db.session.commit()
+
+    remaining = db.session.query(PayrollDirty.id).filter(PayrollDirty.month.notin_(locked)).limit(1).first() is not None
+    stats = {
+        'marks': len(marks),
+        'months': len(by_month),
+        'refreshed': refreshed,
+        'remaining': remaining,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+    if marks:
+        logging.info(f"Dirty payroll recompute: {stats}")
+    return stats
+
+
+def _run(app):
+    global _timer
+    stats = None
+    with app.app_context():
+        try:
+            stats = recompute_dirty()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Dirty payroll recompute failed: {e}")
+        finally:
+            db.session.remove()
+
+    with _timer_lock:
+        _timer = None
+    if stats and stats['remaining']:
+        schedule_recompute(app)
+
+
+def schedule_recompute(app, delay=DEBOUNCE_SECONDS):
+    """Start a debounced recompute in this process unless one is already pending."""
+    global _timer
+    with _timer_lock:
+        if _timer is not None and _timer.is_alive():
+            return False
+        _timer = threading.Timer(delay, _run, args=(app,))
+        _timer.daemon = True
+        _timer.start()
+        return True
@@ -0,0 +1,151 @@
+from extensions import db
+from models import Worker, Salary, PayrollLock, PayrollRun, AuditLog
+from services.payroll import generate_payroll, apply_salary_updates, process_salaries
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+import json
+import logging
+import time
+
+RUN_KINDS = ('generate', 'process', 'update')
+ACTIVE_STATUSES = ('queued', 'running')
+CHUNK_SIZE = 500
+# A run that has not reported progress for this long is treated as dead
+STALE_AFTER = timedelta(minutes=10)
+
+# One background thread per process keeps payroll work off the request threads
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='payroll-run')
+
+
+class PayrollRunError(Exception):
+    pass
+
+
+def active_run(period):
+    """Return the live queued/running run for a period, if any."""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    return PayrollRun.query.filter(
+        PayrollRun.month == period,
+        PayrollRun.status.in_(ACTIVE_STATUSES),
+        PayrollRun.updated_at >= cutoff
+    ).order_by(PayrollRun.id.desc()).first()
+
+
+def _expire_stale_runs(period):
+    """Fail active runs that stopped reporting progress, so they no longer hold the period."""
+    db.session.execute(
+        update(PayrollRun)
+        .where(
+            PayrollRun.month == period,
+            PayrollRun.status.in_(ACTIVE_STATUSES),
+            PayrollRun.updated_at < datetime.utcnow() - STALE_AFTER
+        )
+        .values(status='failed', error='Run stopped reporting progress', finished_at=datetime.utcnow())
+    )
+
+
+def submit_run(app, period, kind, requested_by=None, options=None):
+    """
+    Record a payroll run and hand it to the background executor. Returns
+    (run, created); when the period already has a live run, that run is
+    returned instead. The partial unique index on active runs makes the
+    check race-free: of two concurrent submits, one insert fails and gets
+    the other's run.
+    """
+    if kind not in RUN_KINDS:
+        raise PayrollRunError(f"Unknown run type: {kind}")
+    if PayrollLock.query.filter_by(month=period).first():
+        raise PayrollRunError("Period is locked")
+
+    _expire_stale_runs(period)
+    run = PayrollRun(
+        month=period,
+        kind=kind,
+        status='queued',
+        options=json.dumps(options or {}),
+        requested_by=requested_by
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(run)
+    except IntegrityError:
+        db.session.commit()
+        existing = active_run(period)
+        if existing is None:
+            raise PayrollRunError("Another payroll run for this period just finished; try again")
+        return existing, False
+    db.session.commit()
+
+    _executor.submit(execute_run, app, run.id)
+    return run, True
+
+
+def _target_worker_ids(run, options):
+    if run.kind == 'generate':
+        query = db.session.query(Worker.id).filter(Worker.is_active == True).order_by(Worker.id)
+    else:
+        query = db.session.query(Salary.worker_id).filter(Salary.month == run.month).order_by(Salary.worker_id)
+        if options.get('worker_ids') is not None:
+            query = query.filter(Salary.worker_id.in_([int(w) for w in options['worker_ids']]))
+    return [row[0] for row in query.all()]
+
+
+def _run_chunk(run, options, chunk):
+    if run.kind == 'generate':
+        return generate_payroll(run.month, worker_ids=chunk, commit=False)['inserted']
+    if run.kind == 'process':
+        return process_salaries(run.month, worker_ids=chunk)
+    return apply_salary_updates(run.month, chunk, options.get('updates', {}))
+
+
+def execute_run(app, run_id):
+    """Worker-thread entry point: process a run chunk by chunk, committing progress as it goes."""
+    with app.app_context():
+        run = db.session.get(PayrollRun, run_id)
+        if not run:
+            return
+        started = time.perf_counter()
+        try:
+            options = json.loads(run.options or '{}')
+            run.status = 'running'
+            run.started_at = datetime.utcnow()
+            worker_ids = _target_worker_ids(run, options)
+            run.total = len(worker_ids)
+            db.session.commit()
+
+            for i in range(0, len(worker_ids), CHUNK_SIZE):
+                # Re-check between chunks so a lock taken mid-run stops further writes
+                if PayrollLock.query.filter_by(month=run.month).first():
+                    raise PayrollRunError("Period was locked during the run")
+
+                chunk = worker_ids[i:i + CHUNK_SIZE]
+                run.affected += _run_chunk(run, options, chunk)
+                run.processed += len(chunk)
+                db.session.commit()
+
+            run.status = 'completed'
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Payroll run {run_id} failed: {e}")
+            run = db.session.get(PayrollRun, run_id)
+            run.status = 'failed'
+            run.error = str(e)
+
+        run.finished_at = datetime.utcnow()
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        audit = AuditLog(
+            user_name=run.requested_by or 'System',
+            action=f'payroll_{run.kind}',
+            table_name='salary',
+            record_id=run.id,
+            details=f'Payroll run #{run.id} ({run.kind}) for {run.month} {run.status}: '
+                    f'{run.affected} rows changed, {run.processed}/{run.total} workers in {elapsed_ms} ms',
+            period=run.month,
+            entity_key=f'payroll_run:{run.id}'
+        )
+        db.session.add(audit)
+        db.session.commit()
+        logging.info(f"Payroll run {run.id} {run.status} in {elapsed_ms} ms")
+        db.session.remove()
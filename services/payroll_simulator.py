@@ -0,0 +1,174 @@
+from extensions import db
+from models import Worker, Salary
+from services.payroll import pending_workers, days_present_by_worker, build_salary_rows
+from sqlalchemy import func
+import numpy as np
+import time
+
+MAX_SCENARIOS = 200
+
+
+class SimulationError(Exception):
+    pass
+
+
+def load_inputs(period):
+    """
+    Load a period's payroll inputs as NumPy arrays: days present, daily rate,
+    deductions and a department index per worker. Periods without salary rows
+    are simulated from what generation would produce, without writing anything.
+    """
+    rows = db.session.query(
+        Salary.total_days_present,
+        Salary.daily_rate,
+        Salary.deductions,
+        func.coalesce(Worker.department, '')
+    ).outerjoin(Worker, Salary.worker_id == Worker.id).filter(Salary.month == period).all()
+
+    if not rows:
+        workers = pending_workers(period)
+        generated = build_salary_rows(period, workers, days_present_by_worker(period))
+        departments_by_id = dict(
+            db.session.query(Worker.id, func.coalesce(Worker.department, ''))
+            .filter(Worker.id.in_([w.id for w in workers])).all()
+        ) if workers else {}
+        rows = [(r['total_days_present'], r['daily_rate'], r['deductions'], departments_by_id.get(r['worker_id'], ''))
+                for r in generated]
+
+    departments = sorted({r[3] for r in rows})
+    dept_index = {d: i for i, d in enumerate(departments)}
+
+    return {
+        'days': np.fromiter((r[0] or 0 for r in rows), dtype=np.float64, count=len(rows)),
+        'rate': np.fromiter((r[1] or 0 for r in rows), dtype=np.float64, count=len(rows)),
+        'deductions': np.fromiter((r[2] or 0 for r in rows), dtype=np.float64, count=len(rows)),
+        'dept': np.fromiter((dept_index[r[3]] for r in rows), dtype=np.int64, count=len(rows)),
+        'departments': departments
+    }
+
+
+def _scenario_arrays(scenarios, departments):
+    """Turn scenario dicts into per-scenario parameter vectors (NaN = unchanged)."""
+    n = len(scenarios)
+    new_rate = np.full(n, np.nan)
+    rate_factor = np.ones(n)
+    deduction_pct = np.full(n, np.nan)
+    dept_mask = np.ones((n, len(departments)), dtype=bool)
+
+    for i, sc in enumerate(scenarios):
+        if not isinstance(sc, dict):
+            raise SimulationError(f"Scenario {i + 1} must be an object")
+        try:
+            if sc.get('daily_rate') not in (None, ''):
+                new_rate[i] = float(sc['daily_rate'])
+            if sc.get('rate_change_percent') not in (None, ''):
+                rate_factor[i] = 1 + float(sc['rate_change_percent']) / 100
+            if sc.get('deduction_percent') not in (None, ''):
+                deduction_pct[i] = float(sc['deduction_percent'])
+        except (TypeError, ValueError):
+            raise SimulationError(f"Scenario {i + 1} has a non-numeric value")
+
+        only = sc.get('departments')
+        if only in (None, ''):
+            continue
+        # A string would match departments by substring
+        if not isinstance(only, list):
+            raise SimulationError(f"Scenario {i + 1}: departments must be a list")
+        if only:
+            dept_mask[i] = [d in only for d in departments]
+
+    return new_rate, rate_factor, deduction_pct, dept_mask
+
+
+def _by_department(matrix, dept, dept_count):
+    # (scenarios x workers) @ (workers x departments) one-hot -> per-department sums
+    onehot = np.zeros((dept.shape[0], dept_count))
+    onehot[np.arange(dept.shape[0]), dept] = 1.0
+    return matrix @ onehot
+
+
+def simulate(period, scenarios):
+    """
+    Evaluate what-if scenarios over a period's payroll in one vectorized pass.
+
+    Each scenario may set ``daily_rate`` (absolute), ``rate_change_percent``,
+    ``deduction_percent`` (of gross, as in bulk update) and limit itself to
+    ``departments``. Nothing is written to the database.
+    """
+    if not isinstance(scenarios, list):
+        raise SimulationError("scenarios must be a list")
+    if not scenarios:
+        raise SimulationError("At least one scenario is required")
+    if len(scenarios) > MAX_SCENARIOS:
+        raise SimulationError(f"At most {MAX_SCENARIOS} scenarios per request")
+
+    started = time.perf_counter()
+    inputs = load_inputs(period)
+    loaded = time.perf_counter()
+
+    days, rate, ded, dept = inputs['days'], inputs['rate'], inputs['deductions'], inputs['dept']
+    departments = inputs['departments']
+    new_rate, rate_factor, deduction_pct, dept_mask = _scenario_arrays(scenarios, departments)
+
+    # Baseline (1 x workers)
+    base_gross = days * rate
+    base_net = base_gross - ded
+
+    # Scenarios (scenarios x workers); workers outside a scenario's departments keep baseline values
+    applies = dept_mask[:, dept]
+    sc_rate = np.where(np.isnan(new_rate)[:, None], rate[None, :], new_rate[:, None]) * rate_factor[:, None]
+    sc_rate = np.where(applies, sc_rate, rate[None, :])
+    sc_gross = days[None, :] * sc_rate
+    sc_ded = np.where(
+        applies & ~np.isnan(deduction_pct)[:, None],
+        sc_gross * np.nan_to_num(deduction_pct)[:, None] / 100,
+        ded[None, :]
+    )
+    sc_net = sc_gross - sc_ded
+
+    base_stack = np.vstack([base_gross, ded, base_net])
+    base_dept = _by_department(base_stack, dept, len(departments))
+    gross_dept = _by_department(sc_gross, dept, len(departments))
+    ded_dept = _by_department(sc_ded, dept, len(departments))
+    net_dept = _by_department(sc_net, dept, len(departments))
+    computed = time.perf_counter()
+
+    def totals(gross, deductions, net):
+        return {'gross': round(float(gross), 2), 'deductions': round(float(deductions), 2), 'net': round(float(net), 2)}
+
+    baseline = {
+        'total': totals(base_gross.sum(), ded.sum(), base_net.sum()),
+        'departments': {
+            (d or 'Unassigned'): totals(base_dept[0, j], base_dept[1, j], base_dept[2, j])
+            for j, d in enumerate(departments)
+        }
+    }
+
+    results = []
+    for i, sc in enumerate(scenarios):
+        total = totals(sc_gross[i].sum(), sc_ded[i].sum(), sc_net[i].sum())
+        results.append({
+            'name': sc.get('name') or f'Scenario {i + 1}',
+            'total': total,
+            'delta': {k: round(total[k] - baseline['total'][k], 2) for k in total},
+            'departments': {
+                (d or 'Unassigned'): {
+                    'net': round(float(net_dept[i, j]), 2),
+                    'delta_gross': round(float(gross_dept[i, j] - base_dept[0, j]), 2),
+                    'delta_deductions': round(float(ded_dept[i, j] - base_dept[1, j]), 2),
+                    'delta_net': round(float(net_dept[i, j] - base_dept[2, j]), 2)
+                }
+                for j, d in enumerate(departments)
+            }
+        })
+
+    return {
+        'period': period,
+        'workers': int(days.shape[0]),
+        'baseline': baseline,
+        'scenarios': results,
+        'timing_ms': {
+            'load': round((loaded - started) * 1000, 2),
+            'compute': round((computed - loaded) * 1000, 2)
+        }
+    }
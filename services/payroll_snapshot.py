@@ -0,0 +1,97 @@
+from extensions import db
+from models import Worker, Salary, PayrollSnapshot
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+import hashlib
+import json
+import zlib
+
+# Bump when the payload layout changes; older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+SALARY_FIELDS = [
+    'id', 'worker_id', 'month', 'total_days_present', 'daily_rate', 'deductions',
+    'gross_salary', 'net_salary', 'amount', 'is_processed',
+    'bank_name', 'bank_account', 'bank_account_name', 'payment_date'
+]
+WORKER_FIELDS = [
+    'id', 'worker_code', 'name', 'department', 'position', 'passport',
+    'phone_number', 'email', 'bank_name', 'bank_account', 'bank_account_name'
+]
+
+# Decoded snapshots keyed by (month, checksum); snapshots never change once written
+_cache = {}
+_CACHE_LIMIT = 24
+
+
+def create_snapshot(period):
+    """
+    Freeze a period's salary rows and worker display fields into one
+    zlib-compressed JSON blob. Replaces any earlier snapshot of the period.
+    """
+    columns = [getattr(Salary, f).label(f) for f in SALARY_FIELDS] + \
+              [getattr(Worker, f).label(f'w_{f}') for f in WORKER_FIELDS]
+    stmt = select(*columns).select_from(Salary)\
+        .outerjoin(Worker, Salary.worker_id == Worker.id)\
+        .where(Salary.month == period)\
+        .order_by(Worker.name, Salary.id)
+
+    rows = []
+    for r in db.session.execute(stmt):
+        m = r._mapping
+        row = {f: m[f] for f in SALARY_FIELDS}
+        row['payment_date'] = row['payment_date'].isoformat() if row['payment_date'] else None
+        row['worker'] = {f: m[f'w_{f}'] for f in WORKER_FIELDS} if m['w_id'] is not None else None
+        rows.append(row)
+
+    raw = json.dumps({'version': SNAPSHOT_VERSION, 'month': period, 'rows': rows},
+                     separators=(',', ':')).encode('utf-8')
+
+    delete_snapshot(period)
+    snapshot = PayrollSnapshot(
+        month=period,
+        version=SNAPSHOT_VERSION,
+        row_count=len(rows),
+        checksum=hashlib.sha256(raw).hexdigest(),
+        payload=zlib.compress(raw, 9)
+    )
+    db.session.add(snapshot)
+    return snapshot
+
+
+def delete_snapshot(period):
+    PayrollSnapshot.query.filter_by(month=period).delete()
+
+
+def _to_record(row):
+    record = SimpleNamespace(**{k: v for k, v in row.items() if k != 'worker'})
+    if record.payment_date:
+        record.payment_date = datetime.fromisoformat(record.payment_date)
+    record.worker = SimpleNamespace(**row['worker']) if row.get('worker') else None
+    return record
+
+
+def load_snapshot(period):
+    """
+    Return the frozen salary records for a period as plain objects
+    (each with a .worker namespace), or None when no usable snapshot exists.
+    """
+    head = PayrollSnapshot.query.options(
+        load_only(PayrollSnapshot.month, PayrollSnapshot.version, PayrollSnapshot.checksum)
+    ).filter_by(month=period).first()
+    if not head or head.version != SNAPSHOT_VERSION:
+        return None
+
+    key = (period, head.checksum)
+    rows = _cache.get(key)
+    if rows is None:
+        payload = db.session.query(PayrollSnapshot.payload).filter_by(id=head.id).scalar()
+        rows = json.loads(zlib.decompress(payload).decode('utf-8'))['rows']
+        if len(_cache) >= _CACHE_LIMIT:
+            _cache.pop(next(iter(_cache)))
+        _cache[key] = rows
+
+    # Fresh objects per call so views can attach display fields safely
+    return [_to_record(r) for r in rows]
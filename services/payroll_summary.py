@@ -0,0 +1,178 @@
+from extensions import db
+from models import Worker, Salary, PayrollPeriodSummary
+from services.bulk import dialect_insert, supports_upsert
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import func, select, insert, delete
+
+# Salary ids per IN (...) when re-reading changed rows
+ID_CHUNK = 1000
+
+
+def salary_totals(*criteria, ids=None, lock=False):
+    """
+    Summary contributions of the Salary rows matching ``criteria`` (or with
+    the given ``ids``): a set of their ids and, per (month, department,
+    is_processed) key, [count, gross, deductions, net]. With ``lock`` the
+    rows are locked until commit, so a concurrent write to the same rows
+    waits and then reads the values this one leaves.
+    """
+    base = db.session.query(
+        Salary.id, Salary.month, func.coalesce(Worker.department, ''), Salary.is_processed,
+        Salary.gross_salary, Salary.deductions, Salary.net_salary
+    ).outerjoin(Worker, Salary.worker_id == Worker.id)
+    if lock:
+        base = base.with_for_update(of=Salary)
+
+    if ids is None:
+        rows = base.filter(*criteria).all()
+    else:
+        ids = sorted(ids)
+        rows = [row for start in range(0, len(ids), ID_CHUNK)
+                for row in base.filter(Salary.id.in_(ids[start:start + ID_CHUNK])).all()]
+
+    totals = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for salary_id, month, department, is_processed, gross, deductions, net in rows:
+        add_to_totals(totals, month, department, is_processed, gross, deductions, net)
+    return {row[0] for row in rows}, totals
+
+
+def add_to_totals(totals, month, department, is_processed, gross, deductions, net):
+    entry = totals[(month, department or '', bool(is_processed))]
+    entry[0] += 1
+    entry[1] += float(gross or 0)
+    entry[2] += float(deductions or 0)
+    entry[3] += float(net or 0)
+
+
+def apply_summary_change(before, after):
+    """
+    Add ``after`` minus ``before`` (totals from salary_totals()) to the
+    summary rows with one upsert that increments each key in place, so
+    concurrent writes to the same period never collide on the unique key.
+    Runs in the caller's transaction.
+    """
+    deltas = {}
+    for key in set(before) | set(after):
+        old = before.get(key, (0, 0.0, 0.0, 0.0))
+        new = after.get(key, (0, 0.0, 0.0, 0.0))
+        delta = [n - o for n, o in zip(new, old)]
+        if any(delta):
+            deltas[key] = delta
+    if not deltas:
+        return 0
+
+    now = datetime.utcnow()
+    rows = [{
+        'month': month, 'department': department, 'is_processed': is_processed,
+        'record_count': count, 'total_gross': gross, 'total_deductions': deductions,
+        'total_net': net, 'refreshed_at': now
+    } for (month, department, is_processed), (count, gross, deductions, net) in deltas.items()]
+
+    if supports_upsert():
+        table = PayrollPeriodSummary.__table__
+        stmt = dialect_insert(PayrollPeriodSummary)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['month', 'department', 'is_processed'],
+            set_={
+                'record_count': table.c.record_count + stmt.excluded.record_count,
+                'total_gross': table.c.total_gross + stmt.excluded.total_gross,
+                'total_deductions': table.c.total_deductions + stmt.excluded.total_deductions,
+                'total_net': table.c.total_net + stmt.excluded.total_net,
+                'refreshed_at': stmt.excluded.refreshed_at
+            }
+        )
+        for row in rows:
+            db.session.execute(stmt, row)
+    else:
+        for row in rows:
+            summary = PayrollPeriodSummary.query.filter_by(
+                month=row['month'], department=row['department'], is_processed=row['is_processed']
+            ).with_for_update().first()
+            if summary is None:
+                db.session.add(PayrollPeriodSummary(**row))
+                continue
+            summary.record_count += row['record_count']
+            summary.total_gross += row['total_gross']
+            summary.total_deductions += row['total_deductions']
+            summary.total_net += row['total_net']
+            summary.refreshed_at = now
+
+    # Keys whose last row moved away
+    db.session.execute(delete(PayrollPeriodSummary).where(
+        PayrollPeriodSummary.month.in_({key[0] for key in deltas}),
+        PayrollPeriodSummary.record_count <= 0
+    ))
+    return len(deltas)
+
+
+def refresh_period_summary(period):
+    """
+    Rebuild the payroll_period_summary rows for one period from its Salary rows.
+    Writes keep the summary current through apply_summary_change(); this full
+    rebuild is for repairs. Runs in the caller's transaction.
+    """
+    department = func.coalesce(Worker.department, '')
+    totals = select(
+        Salary.month,
+        department,
+        Salary.is_processed,
+        func.count(Salary.id),
+        func.coalesce(func.sum(Salary.gross_salary), 0),
+        func.coalesce(func.sum(Salary.deductions), 0),
+        func.coalesce(func.sum(Salary.net_salary), 0),
+        func.now()
+    ).select_from(Salary).outerjoin(Worker, Salary.worker_id == Worker.id)\
+     .where(Salary.month == period)\
+     .group_by(Salary.month, department, Salary.is_processed)
+
+    db.session.execute(delete(PayrollPeriodSummary).where(PayrollPeriodSummary.month == period))
+    db.session.execute(
+        insert(PayrollPeriodSummary).from_select(
+            ['month', 'department', 'is_processed', 'record_count',
+             'total_gross', 'total_deductions', 'total_net', 'refreshed_at'],
+            totals
+        )
+    )
+
+
+def refresh_all_summaries():
+    """Rebuild the summary for every period that has salary rows."""
+    periods = [p[0] for p in db.session.query(Salary.month).distinct().all()]
+    db.session.execute(delete(PayrollPeriodSummary))
+    for period in periods:
+        refresh_period_summary(period)
+    return len(periods)
+
+
+def period_totals(period, status_filter='all', department_filter='all'):
+    """Read record count and money totals for a period from the summary table."""
+    query = db.session.query(
+        func.coalesce(func.sum(PayrollPeriodSummary.record_count), 0),
+        func.coalesce(func.sum(PayrollPeriodSummary.total_gross), 0),
+        func.coalesce(func.sum(PayrollPeriodSummary.total_deductions), 0),
+        func.coalesce(func.sum(PayrollPeriodSummary.total_net), 0)
+    ).filter(PayrollPeriodSummary.month == period)
+
+    if status_filter == 'processed':
+        query = query.filter(PayrollPeriodSummary.is_processed == True)
+    elif status_filter == 'pending':
+        query = query.filter(PayrollPeriodSummary.is_processed == False)
+
+    if department_filter != 'all':
+        query = query.filter(PayrollPeriodSummary.department == department_filter)
+
+    count, gross, deductions, net = query.one()
+    return {
+        'count': int(count),
+        'gross': float(gross),
+        'deductions': float(deductions),
+        'net': float(net)
+    }
+
+
+def summary_periods():
+    """Periods that have payroll, newest first, plus the current month."""
+    periods = {p[0] for p in db.session.query(PayrollPeriodSummary.month).distinct().all()}
+    periods.add(datetime.now().strftime('%Y-%m'))
+    return sorted(periods, reverse=True)
@@ -0,0 +1,213 @@
+from flask import render_template
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+import multiprocessing
+import json
+import logging
+import mimetypes
+import os
+import re
+import time
+import zipfile
+
+STYLE_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+# Rendered-but-unconverted documents allowed in flight per pool process
+WINDOW_PER_PROCESS = 4
+MAX_PROCESSES = 4
+
+
+def prepare_payslip(salary, days_in_month):
+    """Attach the display-only fields payslip.html expects. Nothing is saved."""
+    salary.days_in_month = days_in_month
+    salary.present_days = salary.total_days_present or 0
+    salary.attendance_percent = round((salary.present_days / days_in_month) * 100, 1) if days_in_month > 0 else 0
+
+    # Ensure numbers are not None for template
+    salary.daily_rate = salary.daily_rate or 0
+    salary.gross_salary = salary.gross_salary or 0
+    salary.deductions = salary.deductions or 0
+    salary.net_salary = salary.net_salary or 0
+    return salary
+
+
+# ---------------------------------------------------------------
+# Pool process state: one font configuration, one parsed stylesheet
+# and one resource cache per process, reused for every document.
+# ---------------------------------------------------------------
+_font_config = None
+_stylesheet = None
+_static_folder = None
+_host_url = None
+_resource_cache = {}
+
+
+def _fetch(url):
+    from weasyprint.urls import default_url_fetcher
+
+    cached = _resource_cache.get(url)
+    if cached is not None:
+        return dict(cached)
+
+    parsed = urlparse(url)
+    local = parsed.path.startswith('/static/') and (not parsed.netloc or url.startswith(_host_url))
+    if local:
+        path = os.path.join(_static_folder, parsed.path[len('/static/'):])
+        with open(path, 'rb') as f:
+            result = {'string': f.read(), 'mime_type': mimetypes.guess_type(path)[0]}
+    else:
+        result = default_url_fetcher(url, timeout=10)
+        if 'file_obj' in result:
+            with result.pop('file_obj') as f:
+                result['string'] = f.read()
+
+    # Shared assets (logo, stylesheets, fonts) are cached; per-worker photos are not
+    mime = result.get('mime_type') or ''
+    if local or mime.startswith('font/') or mime == 'text/css' or 'font' in mime:
+        _resource_cache[url] = dict(result)
+    return result
+
+
+def _init_process(css_text, static_folder, host_url):
+    global _font_config, _stylesheet, _static_folder, _host_url
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    _static_folder = static_folder
+    _host_url = host_url
+    _font_config = FontConfiguration()
+    _stylesheet = CSS(string=css_text, base_url=host_url, url_fetcher=_fetch, font_config=_font_config)
+
+
+def _render_pdf(filename, html):
+    from weasyprint import HTML
+
+    document = HTML(string=html, base_url=_host_url, url_fetcher=_fetch).render(
+        stylesheets=[_stylesheet],
+        font_config=_font_config
+    )
+    return filename, document.write_pdf(), len(document.pages)
+
+
+class _ZipStream:
+    """Write-only file object that hands ZIP bytes to the response as they are produced."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class PayslipExportError(Exception):
+    pass
+
+
+def _pdf_pool(processes, css_text, static_folder, host_url):
+    ctx = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=processes, mp_context=ctx,
+                               initializer=_init_process,
+                               initargs=(css_text, static_folder, host_url))
+
+
+def stream_payslip_zip(records, period, days_in_month, static_folder, host_url, processes=None):
+    """
+    Return an iterator over a ZIP archive of PDF payslips for ``records``
+    (Salary rows or snapshot records, each with a ``.worker``). HTML is
+    rendered here, in the request context; PDF conversion runs on a process
+    pool with a bounded window of documents in flight, so memory does not
+    grow with the number of payslips. Iterate it inside the request context
+    (stream_with_context).
+
+    The first payslip is converted in this process before anything is
+    returned, so a broken WeasyPrint install (e.g. no libpango) raises
+    PayslipExportError while the caller can still send an error response.
+    """
+    processes = processes or min(MAX_PROCESSES, os.cpu_count() or 1)
+    now = datetime.now()
+
+    def documents():
+        for salary in records:
+            if not salary.worker:
+                continue
+            prepare_payslip(salary, days_in_month)
+            code = salary.worker.worker_code or f'W{salary.worker_id}'
+            html = render_template('payslip.html', salary=salary, worker=salary.worker, period=period, now=now)
+            yield f'payslip_{period}_{code}.pdf', html
+
+    docs = documents()
+    first = next(docs, None)
+    css_text = rendered = None
+    if first is not None:
+        # Every payslip carries the same <style> block: parse it once per process, strip it from each page
+        style = STYLE_RE.search(first[1])
+        css_text = style.group(1) if style else ''
+        try:
+            _init_process(css_text, static_folder, host_url)
+            rendered = _render_pdf(first[0], STYLE_RE.sub('', first[1], count=1))
+        except Exception as e:
+            raise PayslipExportError(f"PDF rendering is unavailable: {e}") from e
+
+    return _zip_payslips(period, docs, rendered, css_text, static_folder, host_url, processes)
+
+
+def _zip_payslips(period, docs, rendered, css_text, static_folder, host_url, processes):
+    window = processes * WINDOW_PER_PROCESS
+    stream = _ZipStream()
+    archive = zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED)
+    started = time.perf_counter()
+    payslips = pages = 0
+
+    if rendered is not None:
+        filename, pdf, count = rendered
+        archive.writestr(filename, pdf)
+        payslips += 1
+        pages += count
+        yield stream.drain()
+
+        pending = []
+        with _pdf_pool(processes, css_text, static_folder, host_url) as pool:
+            for filename, html in docs:
+                pending.append(pool.submit(_render_pdf, filename, STYLE_RE.sub('', html, count=1)))
+                if len(pending) < window:
+                    continue
+                filename, pdf, count = pending.pop(0).result()
+                archive.writestr(filename, pdf)
+                payslips += 1
+                pages += count
+                yield stream.drain()
+
+            for future in pending:
+                filename, pdf, count = future.result()
+                archive.writestr(filename, pdf)
+                payslips += 1
+                pages += count
+                yield stream.drain()
+
+    elapsed = time.perf_counter() - started
+    report = {
+        'period': period,
+        'payslips': payslips,
+        'pages': pages,
+        'seconds': round(elapsed, 2),
+        'pages_per_second': round(pages / elapsed, 2) if elapsed > 0 else 0,
+        'processes': processes
+    }
+    archive.writestr('report.json', json.dumps(report, indent=2))
+    archive.close()
+    logging.info(f"Payslip export for {period}: {report}")
+    yield stream.drain()
@@ -0,0 +1,94 @@
+from flask import current_app
+from functools import lru_cache
+from io import BytesIO
+import base64
+import glob
+import hashlib
+import json
+import logging
+import os
+import qrcode
+
+# Rendered cards kept in memory; each entry is a few KB of base64
+MEMORY_ENTRIES = 512
+
+
+def qr_payload(worker, verify_url):
+    """The data encoded on a worker's ID card."""
+    return {
+        "company": "OKOYA FOOD COMPANY LIMITED",
+        "worker_code": worker.worker_code,
+        "name": worker.name,
+        "position": worker.position,
+        "phone": worker.phone_number or "N/A",
+        "status": "Active" if worker.is_active else "Inactive",
+        "verify_url": verify_url
+    }
+
+
+def render_qr(payload_text):
+    """PNG bytes of a QR code for ``payload_text``."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=4,
+        border=2
+    )
+    qr.add_data(payload_text)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def cache_dir(app):
+    path = app.config.get('QR_CACHE_DIR') or os.path.join(app.instance_path, 'qr_cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def worker_qr_base64(worker, verify_url):
+    """
+    Base64 PNG of a worker's ID-card QR code. Cached by a hash of the payload,
+    in memory and on disk, so a repeat view skips rendering; editing any of
+    the encoded fields changes the hash and the old image is dropped.
+    """
+    payload_text = json.dumps(qr_payload(worker, verify_url), ensure_ascii=False)
+    return _cached_qr(worker.id, payload_text)
+
+
+@lru_cache(maxsize=MEMORY_ENTRIES)
+def _cached_qr(worker_id, payload_text):
+    digest = hashlib.sha256(payload_text.encode('utf-8')).hexdigest()[:32]
+    folder = cache_dir(current_app)
+    path = os.path.join(folder, f"{worker_id}-{digest}.png")
+
+    try:
+        with open(path, 'rb') as f:
+            return base64.b64encode(f.read()).decode('utf-8')
+    except OSError:
+        pass
+
+    png = render_qr(payload_text)
+    try:
+        # Older images of this worker encode stale details
+        forget_worker_qr(worker_id, keep=path)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(png)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logging.warning(f"QR code for worker {worker_id} not cached on disk: {e}")
+    return base64.b64encode(png).decode('utf-8')
+
+
+def forget_worker_qr(worker_id, keep=None):
+    """Remove a worker's cached QR images from disk (all but ``keep``)."""
+    for path in glob.glob(os.path.join(cache_dir(current_app), f"{worker_id}-*.png")):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
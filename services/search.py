@@ -0,0 +1,70 @@
+from extensions import db
+from sqlalchemy import text, func, case, literal
+
+# Trigram indexes (pg_trgm on PostgreSQL, FTS5 trigram tables on SQLite) cannot
+# serve terms shorter than one trigram; those fall back to a plain pattern match
+MIN_TRIGRAM = 3
+
+# Indexed name columns: table -> FTS5 shadow table created by the search migration
+FTS_TABLES = {
+    'workers': 'workers_fts',
+    'materials': 'materials_fts',
+}
+
+_fts_present = {}
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _like_pattern(term):
+    return f'%{_escape_like(term)}%'
+
+
+def _fts_table(table_name):
+    """Name of the FTS5 table indexing ``table_name``, or None if it was never built."""
+    fts = FTS_TABLES.get(table_name)
+    if not fts:
+        return None
+    key = (str(db.engine.url), fts)
+    if key not in _fts_present:
+        found = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': fts}
+        ).first()
+        _fts_present[key] = found is not None
+    return fts if _fts_present[key] else None
+
+
+def name_match(column, term):
+    """
+    Case-insensitive partial match of ``term`` against an indexed name column.
+    Returns (criterion, rank): filter with the criterion, order by the rank
+    (ascending) to get the closest names first.
+    """
+    term = (term or '').strip()
+    dialect = db.engine.dialect.name
+    pattern = _like_pattern(term)
+
+    if dialect == 'postgresql':
+        # The gin_trgm_ops index answers ILIKE '%term%' directly
+        criterion = column.ilike(pattern, escape='\\')
+        rank = -func.word_similarity(term, column)
+        return criterion, rank
+
+    lowered = term.lower()
+    rank = case(
+        (func.lower(column) == lowered, 0),
+        (func.lower(column).like(f'{_escape_like(lowered)}%', escape='\\'), 1),
+        else_=2
+    ) + func.length(column) / literal(1000.0)
+
+    fts = _fts_table(column.table.name) if dialect == 'sqlite' and len(term) >= MIN_TRIGRAM else None
+    if fts:
+        phrase = '"' + term.replace('"', '""') + '"'
+        ids = text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :phrase").bindparams(phrase=phrase)
+        criterion = column.table.c.id.in_(ids.columns(column.table.c.id))
+        return criterion, rank
+
+    return column.ilike(pattern, escape='\\'), rank
@@ -0,0 +1,82 @@
+from extensions import db
+from models import Worker, WorkerCodeCounter
+from services.bulk import dialect_insert, supports_upsert
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+
+CODE_PREFIX = 'OFCL'
+# PostgreSQL sequence behind the codes; created and positioned by the migration
+SEQUENCE_NAME = 'worker_code_seq'
+COUNTER_NAME = 'worker_code'
+MAX_BLOCK = 5000
+
+
+def format_worker_code(number):
+    return f"{CODE_PREFIX}{number:04d}"
+
+
+def highest_code_number():
+    """Largest number among existing OFCL#### codes; only used to seed the counter."""
+    best = 0
+    for (code,) in db.session.query(Worker.worker_code).filter(Worker.worker_code.like(f'{CODE_PREFIX}%')).all():
+        digits = code[len(CODE_PREFIX):]
+        if digits.isdigit():
+            best = max(best, int(digits))
+    return best
+
+
+def _bump_counter(count):
+    """Advance the counter row by ``count``; returns the new value, or None if there is no row yet."""
+    result = db.session.execute(
+        update(WorkerCodeCounter)
+        .where(WorkerCodeCounter.name == COUNTER_NAME)
+        .values(value=WorkerCodeCounter.value + count)
+    )
+    if result.rowcount == 0:
+        return None
+    # The UPDATE holds the write lock until commit, so this reads our own increment
+    return db.session.execute(
+        select(WorkerCodeCounter.value).where(WorkerCodeCounter.name == COUNTER_NAME)
+    ).scalar_one()
+
+
+def _seed_counter():
+    row = {'name': COUNTER_NAME, 'value': highest_code_number()}
+    if supports_upsert():
+        stmt = dialect_insert(WorkerCodeCounter).values(row).on_conflict_do_nothing(index_elements=['name'])
+        db.session.execute(stmt)
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(WorkerCodeCounter.__table__.insert().values(row))
+    except IntegrityError:
+        pass
+
+
+def reserve_worker_codes(count=1):
+    """
+    Hand out ``count`` unused worker codes without scanning the workers table.
+
+    On PostgreSQL the numbers come from a sequence, so concurrent callers never
+    wait on each other; a rolled-back registration leaves a gap. Elsewhere an
+    atomic UPDATE on worker_code_counter runs in the caller's transaction and
+    serialises registrations until commit, so a rollback returns the numbers.
+    """
+    if count < 1 or count > MAX_BLOCK:
+        raise ValueError(f"count must be between 1 and {MAX_BLOCK}")
+
+    if db.engine.dialect.name == 'postgresql':
+        numbers = db.session.execute(
+            select(func.nextval(SEQUENCE_NAME)).select_from(func.generate_series(1, count))
+        ).scalars().all()
+        return [format_worker_code(n) for n in sorted(numbers)]
+
+    last = _bump_counter(count)
+    if last is None:
+        _seed_counter()
+        last = _bump_counter(count)
+    return [format_worker_code(n) for n in range(last - count + 1, last + 1)]
+
+
+def next_worker_code():
+    return reserve_worker_codes(1)[0]
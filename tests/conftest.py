@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+import pytest
+
+# The app reads its database URL at import time
+_db_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+_db_file.close()
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_file.name
+os.environ['RENDER'] = 'true'  # no backup thread
+os.environ['PASSPORT_RESUME_ON_START'] = 'false'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from extensions import db  # noqa: E402
+from models import Worker  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['role'] = 'admin'
+        session['username'] = 'tester'
+    return client
+
+
+def wait_for_payroll_runs():
+    """Block until the background payroll executor has finished every queued run."""
+    from services.payroll_runs import _executor
+    _executor.submit(lambda: None).result(timeout=60)
+    db.session.expire_all()
+
+
+def make_worker(number, **fields):
+    values = dict(
+        worker_code=f"OFCL{number:04d}", name=f"Worker {number}", phone_number=f"080{number:08d}",
+        date_of_birth=date(1990, 1, 1), gender='Male', qualifications='SSCE', position='Cook',
+        national_id=f"NIN{number}", nationality='Nigerian', home_address='Lagos', ethnic_group='Yoruba',
+        place_of_residence='Lagos', email=f"worker{number}@example.com", date_of_employment=date(2020, 1, 1),
+        amount_of_salary=30000, daily_rate=0, bank_name='GTB', bank_account=f"{number:010d}",
+        bank_account_name=f"Worker {number}", guarantor='Guarantor', department='Kitchen'
+    )
+    values.update(fields)
+    worker = Worker(**values)
+    db.session.add(worker)
+    return worker
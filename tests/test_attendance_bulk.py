@@ -0,0 +1,59 @@
+import json
+
+from flask import template_rendered
+
+import services.attendance
+from extensions import db
+from models import Attendance
+from services.attendance_sync import apply_attendance_sync
+from tests.conftest import make_worker
+
+
+def test_superseded_records_are_not_failures(app, admin_client):
+    first, second = make_worker(1), make_worker(2)
+    db.session.commit()
+
+    records = [
+        {'worker_id': first.id, 'status': 'Present'},
+        {'worker_id': second.id, 'status': 'Holiday'},
+        {'worker_id': first.id, 'status': 'Late'},
+    ]
+    response = admin_client.post('/attendance', data={'bulk_data': json.dumps(records)},
+                                 headers={'Accept': 'application/json'})
+    data = response.get_json()
+
+    assert (data['saved'], data['superseded'], data['failed']) == (1, 1, 1)
+    assert [r['result'] for r in data['results']] == ['superseded', 'failed', 'saved']
+    assert [a.status for a in Attendance.query.all()] == ['Late']
+
+
+
+def test_attendance_page_counts_todays_statuses(app, admin_client):
+    workers = [make_worker(n) for n in range(1, 5)]
+    make_worker(5, is_active=False)
+    db.session.commit()
+    records = [{'worker_id': w.id, 'status': s} for w, s in zip(workers, ['Present', 'Present', 'Late'])]
+    admin_client.post('/attendance', data={'bulk_data': json.dumps(records)}, headers={'Accept': 'application/json'})
+
+    contexts = []
+    def capture(sender, template, context, **extra):
+        contexts.append(context)
+    with template_rendered.connected_to(capture, app):
+        assert admin_client.get('/attendance').status_code == 200
+
+    context = contexts[-1]
+    assert [context[key] for key in ('total_workers', 'today_present_count', 'today_absent_count',
+                                     'today_late_count', 'today_leave_count')] == [4, 2, 0, 1, 0]
+
+
+def test_sync_restores_and_reads_stored_rows_once(app, monkeypatch):
+    worker = make_worker(1)
+    db.session.commit()
+
+    def second_restore(pairs):
+        raise AssertionError("upsert_attendance repeated the restore and lookup")
+    monkeypatch.setattr(services.attendance, 'restore_archived', second_restore)
+
+    result = apply_attendance_sync([{'key': 'k1', 'worker_id': worker.id, 'date': '2026-03-02',
+                                     'status': 'Present', 'updated_at': '2026-03-02T08:00:00'}])
+    assert result['applied'] == 1
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from extensions import db
+from models import Attendance
+import services.attendance_import as attendance_import
+from tests.conftest import make_worker
+
+CSV = """worker_code,date,status
+OFCL0001,2026-07-01,Present
+OFCL0002,2026-07-01,Present
+OFCL0003,2026-07-01,Present
+OFCL0001,2026-07-01,Late
+OFCL0001,2026-07-02,Absent
+"""
+
+
+@pytest.mark.parametrize('dry_run', [True, False])
+def test_repeat_after_a_flushed_batch_counts_once(app, monkeypatch, dry_run):
+    for number in (1, 2, 3):
+        make_worker(number)
+    db.session.commit()
+    monkeypatch.setattr(attendance_import, 'IMPORT_BATCH', 2)
+
+    summary = attendance_import.import_attendance(io.BytesIO(CSV.encode()), 'july.csv', dry_run=dry_run)
+
+    assert (summary['rows'], summary['saved'], summary['updated'], summary['duplicates']) == (5, 4, 0, 1)
+    assert [c['type'] for c in summary['conflicts']] == ['duplicate']
+    stored = {(a.worker.worker_code, a.date.day): a.status for a in Attendance.query.all()}
+    if dry_run:
+        assert stored == {}
+    else:
+        assert stored == {('OFCL0001', 1): 'Late', ('OFCL0002', 1): 'Present',
+                          ('OFCL0003', 1): 'Present', ('OFCL0001', 2): 'Absent'}
+
+
+def test_ambiguous_status_letter_is_rejected(app):
+    make_worker(1)
+    db.session.commit()
+    sheet = "worker_code,date,status\nOFCL0001,2026-07-01,L\nOFCL0001,2026-07-02,P\n"
+
+    summary = attendance_import.import_attendance(io.BytesIO(sheet.encode()), 'july.csv')
+
+    assert (summary['saved'], summary['failed']) == (1, 1)
+    assert 'ambiguous' in summary['errors'][0]['error']
+    assert [a.status for a in Attendance.query.all()] == ['Present']
@@ -0,0 +1,85 @@
+from datetime import date, datetime, time
+
+from extensions import db
+from models import Attendance, AttendanceArchive, AttendanceMonthly
+from services.attendance_archive import compact_month
+from services.attendance_monthly import refresh_attendance_monthly
+from services.attendance_sync import apply_attendance_sync
+from tests.conftest import make_worker
+
+MONTH = '2026-03'
+
+
+def rollup():
+    return sorted(
+        (r.worker_id, r.month, r.present, r.absent, r.late, r.leave, round(r.total_hours, 2))
+        for r in AttendanceMonthly.query.all()
+    )
+
+
+def test_refresh_updates_rows_in_place(app):
+    first, second = make_worker(1), make_worker(2)
+    db.session.commit()
+    db.session.add_all([
+        Attendance(worker_id=first.id, date=date(2026, 3, 2), status='Present',
+                   time_in=time(8), time_out=time(16)),
+        Attendance(worker_id=second.id, date=date(2026, 3, 2), status='Absent'),
+    ])
+    refresh_attendance_monthly([(first.id, MONTH), (second.id, MONTH)])
+    db.session.commit()
+    row_id = AttendanceMonthly.query.filter_by(worker_id=first.id).one().id
+
+    db.session.add(Attendance(worker_id=first.id, date=date(2026, 3, 3), status='Late',
+                              time_in=time(22), time_out=time(6)))
+    Attendance.query.filter_by(worker_id=second.id).delete()
+    refresh_attendance_monthly([(first.id, MONTH), (second.id, MONTH)])
+    db.session.commit()
+
+    assert rollup() == [(first.id, MONTH, 1, 0, 1, 0, 16.0)]
+    # Upserted, not deleted and re-inserted
+    assert AttendanceMonthly.query.filter_by(worker_id=first.id).one().id == row_id
+
+
+def test_compaction_keeps_rows_with_unknown_status(app):
+    worker = make_worker(1)
+    db.session.commit()
+    db.session.add_all([
+        Attendance(worker_id=worker.id, date=date(2026, 3, 2), status='Present '),
+        Attendance(worker_id=worker.id, date=date(2026, 3, 3), status='Half Day'),
+        Attendance(worker_id=worker.id, date=date(2026, 3, 4), status='Late'),
+    ])
+    db.session.commit()
+
+    assert compact_month(MONTH) == 1
+    db.session.commit()
+
+    record = AttendanceArchive.query.one()
+    assert record.present_days == 0b10 and record.late_days == 0b1000
+    assert [a.status for a in Attendance.query.all()] == ['Half Day']
+    assert rollup() == [(worker.id, MONTH, 1, 0, 1, 0, 0.0)]
+
+
+def test_restored_days_keep_their_own_change_time(app):
+    worker = make_worker(1)
+    db.session.commit()
+    db.session.add_all([
+        Attendance(worker_id=worker.id, date=date(2026, 3, 2), status='Present',
+                   updated_at=datetime(2026, 3, 2, 9, 0)),
+        Attendance(worker_id=worker.id, date=date(2026, 3, 20), status='Late',
+                   updated_at=datetime(2026, 3, 20, 9, 0, 0, 123456)),
+    ])
+    db.session.commit()
+    compact_month(MONTH)
+    db.session.commit()
+
+    # A client edit of the 2nd made after that day's change, but before the 20th's
+    result = apply_attendance_sync([{
+        'key': 'edit-1', 'worker_id': worker.id, 'date': '2026-03-02', 'status': 'Absent',
+        'updated_at': '2026-03-10T12:00:00'
+    }])
+    db.session.commit()
+
+    assert result['applied'] == 1
+    stored = {a.date.day: (a.status, a.updated_at) for a in Attendance.query.all()}
+    assert stored[2][0] == 'Absent'
+    assert stored[20] == ('Late', datetime(2026, 3, 20, 9, 0, 0, 123456))
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from extensions import db
+from models import Salary, AuditLog
+import services.payroll as payroll
+from tests.conftest import make_worker
+
+PERIOD = '2026-04'
+
+
+def test_generated_rate_matches_auto_fill(app):
+    workers = [make_worker(1, daily_rate=1500), make_worker(2, amount_of_salary=45000),
+               make_worker(3, amount_of_salary=0)]
+    db.session.commit()
+
+    payroll.generate_payroll(PERIOD)
+    generated = {s.worker_id: s.daily_rate for s in Salary.query.filter_by(month=PERIOD)}
+
+    with db.session.no_autoflush:
+        for worker in workers:
+            expected = Salary(worker_id=worker.id, month=PERIOD, worker=worker)
+            assert generated[worker.id] == expected.auto_fill_from_worker().daily_rate
+
+
+def test_lost_race_keeps_the_callers_work(app, monkeypatch):
+    worker = make_worker(1)
+    db.session.commit()
+    db.session.add(Salary(worker_id=worker.id, month=PERIOD, total_days_present=0, daily_rate=0, deductions=0))
+    db.session.commit()
+
+    # As if another run inserted this worker's row after we listed the pending ones
+    stale = SimpleNamespace(id=worker.id, department='Kitchen', daily_rate=0, amount_of_salary=30000,
+                            bank_name=None, bank_account=None, bank_account_name='Worker 1')
+    monkeypatch.setattr(payroll, 'pending_workers', lambda period, worker_ids=None: [stale])
+    db.session.add(AuditLog(action='CALLER', table_name='salary'))
+    db.session.flush()
+
+    stats = payroll.generate_payroll(PERIOD, commit=False)
+    db.session.commit()
+
+    assert stats['inserted'] == 0
+    assert AuditLog.query.filter_by(action='CALLER').count() == 1
+    assert Salary.query.filter_by(month=PERIOD).count() == 1
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import PayrollRun, Salary
+from services.payroll_runs import submit_run
+from tests.conftest import make_worker, wait_for_payroll_runs
+
+PERIOD = '2026-03'
+
+
+def test_first_visit_generates_payroll_in_the_background(app, admin_client):
+    for i in range(1, 4):
+        make_worker(i)
+    db.session.commit()
+
+    response = admin_client.get(f'/salary/?period={PERIOD}')
+    assert response.status_code == 200
+    assert b'runBanner' in response.data
+    wait_for_payroll_runs()
+
+    run = PayrollRun.query.filter_by(month=PERIOD).one()
+    assert (run.kind, run.status, run.affected) == ('generate', 'completed', 3)
+    assert Salary.query.filter_by(month=PERIOD).count() == 3
+
+
+def test_period_without_active_workers_starts_no_run(app, admin_client):
+    make_worker(1, is_active=False)
+    db.session.commit()
+
+    for _ in range(2):
+        assert admin_client.get(f'/salary/?period={PERIOD}').status_code == 200
+        wait_for_payroll_runs()
+    assert PayrollRun.query.filter_by(month=PERIOD).count() == 0
+
+
+def test_database_allows_one_active_run_per_period(app):
+    db.session.add(PayrollRun(month=PERIOD, kind='generate', status='queued'))
+    db.session.commit()
+    db.session.add(PayrollRun(month=PERIOD, kind='process', status='running'))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+    # Finished runs do not count
+    db.session.add(PayrollRun(month=PERIOD, kind='process', status='completed'))
+    db.session.commit()
+
+
+def test_submit_returns_the_live_run_instead_of_starting_another(app):
+    live = PayrollRun(month=PERIOD, kind='generate', status='running')
+    db.session.add(live)
+    db.session.commit()
+
+    run, created = submit_run(app, PERIOD, 'process')
+    assert not created and run.id == live.id
+    assert PayrollRun.query.filter_by(month=PERIOD).count() == 1
@@ -0,0 +1,35 @@
+import pytest
+
+from extensions import db
+from models import Salary
+from services.payroll_simulator import simulate, SimulationError
+from tests.conftest import make_worker
+
+PERIOD = '2026-05'
+
+
+@pytest.mark.parametrize('scenarios, message', [
+    ({'daily_rate': 100}, 'must be a list'),
+    (['raise'], 'must be an object'),
+    ([{'rate_change_percent': 10, 'departments': 'Kitchen'}], 'departments must be a list'),
+])
+def test_malformed_scenarios_are_rejected(app, scenarios, message):
+    with pytest.raises(SimulationError, match=message):
+        simulate(PERIOD, scenarios)
+
+
+def test_malformed_scenarios_return_400(app, admin_client):
+    response = admin_client.post('/salary/simulate', json={'period': PERIOD, 'scenarios': [42]})
+    assert response.status_code == 400
+
+
+def test_department_list_limits_a_scenario(app):
+    for number, department in ((1, 'Kitchen'), (2, 'Kitchenette')):
+        worker = make_worker(number, department=department)
+        db.session.flush()
+        db.session.add(Salary(worker_id=worker.id, month=PERIOD, total_days_present=10,
+                              daily_rate=1000, deductions=0).calculate())
+    db.session.commit()
+
+    result = simulate(PERIOD, [{'daily_rate': 2000, 'departments': ['Kitchen']}])['scenarios'][0]
+    assert result['delta']['gross'] == 10000
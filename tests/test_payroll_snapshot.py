@@ -0,0 +1,23 @@
+from extensions import db
+from tests.conftest import make_worker, wait_for_payroll_runs
+
+PERIOD = '2026-01'
+
+
+def test_locked_period_pages_render_from_snapshot(app, admin_client):
+    worker = make_worker(1, passport='https://example.com/passports/one.jpg')
+    make_worker(2)
+    db.session.commit()
+    worker_id = worker.id
+
+    assert admin_client.get(f'/salary/?period={PERIOD}').status_code == 200
+    wait_for_payroll_runs()
+    response = admin_client.post(f'/salary/toggle-lock?period={PERIOD}')
+    assert response.get_json()['locked'] is True
+
+    for path in (f'/salary/?period={PERIOD}',
+                 f'/salary/history?period={PERIOD}',
+                 f'/salary/payslip/{worker_id}?period={PERIOD}'):
+        response = admin_client.get(path)
+        assert response.status_code == 200, path
+        assert b'https://example.com/passports/one.jpg' in response.data, path
@@ -0,0 +1,61 @@
+from extensions import db
+from models import Salary, PayrollPeriodSummary
+from services.payroll_summary import refresh_period_summary
+from tests.conftest import make_worker, wait_for_payroll_runs
+
+PERIOD = '2026-02'
+
+
+def summary_rows():
+    return sorted(
+        (s.month, s.department, s.is_processed, s.record_count,
+         round(s.total_gross, 2), round(s.total_deductions, 2), round(s.total_net, 2))
+        for s in PayrollPeriodSummary.query.all()
+    )
+
+
+def rebuilt_rows():
+    maintained = summary_rows()
+    refresh_period_summary(PERIOD)
+    rebuilt = summary_rows()
+    db.session.rollback()
+    return maintained, rebuilt
+
+
+def test_salary_writes_keep_the_summary_in_step(app, admin_client):
+    workers = [make_worker(i, department=['Kitchen', 'Admin'][i % 2]) for i in range(1, 7)]
+    db.session.commit()
+    ids = [w.id for w in workers]
+
+    assert admin_client.get(f'/salary/?period={PERIOD}').status_code == 200
+    wait_for_payroll_runs()
+    maintained, rebuilt = rebuilt_rows()
+    assert maintained == rebuilt and len(maintained) == 2
+
+    response = admin_client.post('/salary/save', json={
+        'worker_id': ids[0], 'month': PERIOD, 'total_days_present': 20, 'daily_rate': 1500, 'deductions': 100
+    })
+    assert response.get_json()['success']
+    response = admin_client.post('/salary/bulk-update', json={
+        'worker_ids': ids[1:3], 'month': PERIOD, 'updates': {'daily_rate': 1200, 'status': 'processed'}
+    })
+    assert response.status_code == 202
+    wait_for_payroll_runs()
+    maintained, rebuilt = rebuilt_rows()
+    assert maintained == rebuilt
+
+    worker = db.session.get(type(workers[0]), ids[3])
+    form = {field: getattr(worker, field) for field in (
+        'name', 'phone_number', 'gender', 'email', 'qualifications', 'position', 'national_id',
+        'nationality', 'home_address', 'ethnic_group', 'place_of_residence', 'bank_name',
+        'bank_account', 'bank_account_name', 'guarantor', 'amount_of_salary')}
+    form.update(department='Logistics', date_of_birth='1990-01-01', date_of_employment='2020-01-01')
+    assert admin_client.post(f'/workers/edit_worker/{ids[3]}', data=form).status_code == 302
+    assert admin_client.post(f'/workers/delete_worker/{ids[4]}').status_code == 302
+    assert admin_client.post(f'/salary/save-all?period={PERIOD}').status_code == 202
+    wait_for_payroll_runs()
+
+    maintained, rebuilt = rebuilt_rows()
+    assert maintained == rebuilt
+    assert ('Logistics', True) in {(row[1], row[2]) for row in maintained}
+    assert sum(row[3] for row in maintained) == Salary.query.filter_by(month=PERIOD).count() == 5
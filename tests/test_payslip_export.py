@@ -0,0 +1,55 @@
+import io
+import json
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from extensions import db
+from models import Salary
+import services.payslip_pdf as payslip_pdf
+from tests.conftest import make_worker
+
+PERIOD = '2026-06'
+
+
+@pytest.fixture
+def payroll(app):
+    for number in (1, 2, 3):
+        worker = make_worker(number)
+        db.session.flush()
+        db.session.add(Salary(worker_id=worker.id, month=PERIOD, total_days_present=20,
+                              daily_rate=1000, deductions=0).calculate())
+    db.session.commit()
+
+
+@pytest.fixture
+def stub_renderer(monkeypatch):
+    """Convert in threads with a fake PDF instead of WeasyPrint in spawned processes."""
+    monkeypatch.setattr(payslip_pdf, '_init_process', lambda css_text, static_folder, host_url: None)
+    monkeypatch.setattr(payslip_pdf, '_render_pdf',
+                        lambda filename, html: (filename, b'%PDF-stub ' + filename.encode(), 2))
+    monkeypatch.setattr(payslip_pdf, '_pdf_pool',
+                        lambda processes, *initargs: ThreadPoolExecutor(max_workers=processes))
+
+
+def test_export_zips_one_pdf_per_payslip_and_a_report(payroll, admin_client, stub_renderer):
+    response = admin_client.get(f'/salary/payslips/export?period={PERIOD}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/zip'
+
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.namelist() == [f'payslip_{PERIOD}_OFCL{n:04d}.pdf' for n in (1, 2, 3)] + ['report.json']
+    assert archive.read(f'payslip_{PERIOD}_OFCL0002.pdf').startswith(b'%PDF-stub')
+    report = json.loads(archive.read('report.json'))
+    assert (report['period'], report['payslips'], report['pages']) == (PERIOD, 3, 6)
+
+
+def test_export_fails_before_streaming_when_pdf_rendering_is_broken(payroll, admin_client, monkeypatch):
+    def missing_library(*args):
+        raise OSError("cannot load library 'libpango-1.0-0'")
+    monkeypatch.setattr(payslip_pdf, '_init_process', missing_library)
+
+    response = admin_client.get(f'/salary/payslips/export?period={PERIOD}')
+    assert response.status_code == 302
+    assert response.mimetype != 'application/zip'
@@ -0,0 +1,48 @@
+import threading
+
+from extensions import db
+from models import Worker
+from services.worker_codes import next_worker_code, reserve_worker_codes
+from tests.conftest import make_worker
+
+THREADS = 8
+PER_THREAD = 15
+
+
+def test_parallel_registrations_get_unique_consecutive_codes(app):
+    make_worker(41)  # OFCL0041: the counter seeds itself from the highest existing code
+    db.session.commit()
+
+    codes, errors = [], []
+
+    def register(thread):
+        for i in range(PER_THREAD):
+            with app.app_context():
+                try:
+                    code = next_worker_code()
+                    number = 1000 + thread * PER_THREAD + i
+                    make_worker(number, worker_code=code)
+                    db.session.commit()
+                    codes.append(code)
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(repr(e))
+
+    threads = [threading.Thread(target=register, args=(t,)) for t in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    expected = [f"OFCL{n:04d}" for n in range(42, 42 + THREADS * PER_THREAD)]
+    assert sorted(codes) == expected
+    assert Worker.query.count() == 1 + THREADS * PER_THREAD
+
+
+def test_reserve_block_continues_the_sequence(app):
+    make_worker(7)
+    db.session.commit()
+
+    assert reserve_worker_codes(3) == ['OFCL0008', 'OFCL0009', 'OFCL0010']
+    assert next_worker_code() == 'OFCL0011'
@@ -0,0 +1,59 @@
+from flask import template_rendered
+
+import routes.workers
+from extensions import db
+from models import Worker
+from services.search import name_match
+from tests.conftest import make_worker
+
+
+def found(client, q):
+    page = client.get('/workers/', query_string={'q': q}).get_data(as_text=True)
+    return {n for n in (1, 2, 3) if f'OFCL{n:04d}' in page}
+
+
+def test_search_matches_name_code_phone_and_position(app, admin_client):
+    make_worker(1, name='Adaeze Okafor', position='Cook')
+    make_worker(2, name='Tunde Bello', position='Driver')
+    make_worker(3, name='Grace Adeyemi', position='Store Keeper')
+    db.session.commit()
+
+    assert found(admin_client, 'okafor') == {1}
+    assert found(admin_client, 'ofcl0002') == {2}
+    assert found(admin_client, '08000000003') == {3}
+    assert found(admin_client, 'store keeper') == {3}
+    assert found(admin_client, 'ad') == {1, 3}
+
+
+def test_prefix_rank_treats_wildcards_literally(app):
+    make_worker(1, name='Ade_Bola')
+    make_worker(2, name='AdeXBola')
+    db.session.commit()
+
+    criterion, rank = name_match(Worker.name, 'ade_')
+    ranked = db.session.query(Worker.name, rank).filter(criterion).order_by(rank).all()
+    assert [(name, int(score)) for name, score in ranked] == [('Ade_Bola', 1)]
+    _, rank = name_match(Worker.name, 'ade%')
+    assert {name: int(score) for name, score in db.session.query(Worker.name, rank)} == \
+        {'Ade_Bola': 2, 'AdeXBola': 2}
+
+
+def test_search_pages_closest_matches_first(app, admin_client, monkeypatch):
+    monkeypatch.setattr(routes.workers, 'WORKERS_PER_PAGE', 2)
+    make_worker(1, name='Tunde Adeyemi')
+    make_worker(2, name='Adebola Kareem')
+    make_worker(3, name='Ade')
+    make_worker(4, name='Bisi Ola', phone_number='ade')
+    db.session.commit()
+
+    pages = []
+    def capture(sender, template, context, **extra):
+        pages.append(context['pagination'])
+    with template_rendered.connected_to(capture, app):
+        admin_client.get('/workers/', query_string={'q': 'ade'})
+        admin_client.get('/workers/', query_string={'cursor': pages[0].next_cursor})
+        admin_client.get('/workers/', query_string={'cursor': pages[1].prev_cursor})
+
+    names = [[w.name for w in page.items] for page in pages]
+    assert names == [['Bisi Ola', 'Ade'], ['Adebola Kareem', 'Tunde Adeyemi'], ['Bisi Ola', 'Ade']]
+    assert pages[1].next_cursor is None
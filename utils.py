@@ -1,7 +1,11 @@
-import time
-from flask import url_for, session, flash, redirect
+import base64
+import json
+from flask import url_for, session, flash, redirect, current_app
 from functools import wraps
 from datetime import datetime
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import Label
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
@@ -15,16 +19,187 @@ def allowed_file(filename):
         filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
     )
 
-def get_passport_url(worker):
+def get_passport_url(worker, variant=None):
     """
-    Return URL for worker passport.
-    Cloudinary stores the full URL in worker.passport, so we just return it.
-    Falls back to default.png if no passport.
+    Return URL for worker passport, optionally one of the thumbnail variants
+    ('list', 'card', 'profile') made at upload time.
+    Stored URLs change with the photo, so they are cacheable as they are;
+    anything else is versioned by the worker's updated_at.
+    Falls back to default.png if no passport. While a new photo is still
+    uploading, the staged copy is served instead.
+    Also takes the display-only workers of payroll snapshots, which carry
+    no upload state or updated_at.
     """
-    if worker.passport:
-        # Add cache-buster so browser reloads after update
-        return f"{worker.passport}?v={int(time.time())}"
-    return url_for('static', filename='default.png')
+    updated_at = getattr(worker, 'updated_at', None)
+    if getattr(worker, 'passport_status', None) in ('pending', 'uploading') and getattr(worker, 'passport_staged', None):
+        return url_for('workers.staged_passport', worker_id=worker.id)
+    if not worker.passport:
+        return url_for('static', filename='default.png')
+    if not worker.passport.startswith(('http', '/')):
+        # Older rows hold a filename under static/uploads
+        url, versioned = url_for('static', filename='uploads/' + worker.passport), False
+    else:
+        from services.passport_upload import passport_variant
+        url, versioned = passport_variant(current_app, worker.passport, variant)
+    if versioned or not updated_at:
+        return url
+    return f"{url}?v={int(updated_at.timestamp())}"
+
+class ListPagination(Pagination):
+    """Pagination over an in-memory list, for pages not backed by a query."""
+
+    def _query_items(self):
+        items = self._query_args['items']
+        return items[self._query_offset:self._query_offset + self.per_page]
+
+    def _query_count(self):
+        return len(self._query_args['items'])
+
+def encode_cursor(data):
+    """Pack a dict of keyset values into an opaque, URL-safe token."""
+    raw = json.dumps(data, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Unpack a token made by encode_cursor(). Returns None if it is missing or malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return data if isinstance(data, dict) else None
+    except (ValueError, TypeError):
+        return None
+
+class KeysetPage:
+    """One page of a keyset-paginated query, with opaque tokens for the pages either side."""
+
+    def __init__(self, items, filters, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.filters = filters
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def _beyond(columns, values, newer):
+    # Portable row comparison: (c1, c2) < (v1, v2) expanded into OR/AND terms
+    terms = []
+    for i, column in enumerate(columns):
+        edge = column > values[i] if newer else column < values[i]
+        terms.append(and_(*[columns[j] == values[j] for j in range(i)], edge))
+    return or_(*terms)
+
+def keyset_paginate(query, keys, filters, state=None, per_page=50, count=False):
+    """
+    Page ``query`` newest-first on ``keys`` without OFFSET.
+
+    ``keys`` is a list of (column, parse) pairs, e.g. [(Attendance.date, date.fromisoformat),
+    (Attendance.id, int)], ending in a unique column. A key may also be a labelled
+    expression whose value the query loads onto an attribute of the same name. ``state`` is a decoded cursor from a
+    previous page; the tokens handed out carry ``filters`` so the caller can rebuild the same
+    query from the token alone. ``count`` runs one COUNT, which later tokens carry along.
+    """
+    # A labelled expression (e.g. a search rank) is compared and ordered as its expression
+    # and read back from the attribute of the same name, loaded with with_expression()
+    columns = [column.element if isinstance(column, Label) else column for column, _ in keys]
+    names = [column.key for column, _ in keys]
+    total = state.get('t') if state else None
+    position = None
+    if state:
+        try:
+            position = [parse(v) for (_, parse), v in zip(keys, state['k'])]
+            if len(position) != len(keys):
+                position = None
+        except (KeyError, TypeError, ValueError):
+            position = None
+    backwards = bool(position) and state.get('d') == 'prev'
+
+    if count and total is None:
+        total = query.order_by(None).count()
+
+    query = query.order_by(None)
+    if position:
+        query = query.filter(_beyond(columns, position, newer=backwards))
+    if backwards:
+        query = query.order_by(*[c.asc() for c in columns])
+    else:
+        query = query.order_by(*[c.desc() for c in columns])
+
+    items = query.limit(per_page + 1).all()
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    def token(item, direction):
+        values = [getattr(item, name) for name in names]
+        data = {'f': filters, 'k': values, 'd': direction}
+        if total is not None:
+            data['t'] = total
+        return encode_cursor(data)
+
+    has_next = more if not backwards else True
+    has_prev = bool(position) if not backwards else more
+    return KeysetPage(
+        items,
+        filters,
+        next_cursor=token(items[-1], 'next') if items and has_next else None,
+        prev_cursor=token(items[0], 'prev') if items and has_prev else None,
+        total=total
+    )
+
+def keyset_paginate_rows(rows, keys, filters, state=None, per_page=50):
+    """
+    keyset_paginate() for rows already in memory, e.g. attendance expanded from
+    the compact archive. ``keys`` are (attribute, parse) pairs ending in a unique
+    combination; the tokens have the same shape, so pages link the same way.
+    """
+    names = [name for name, _ in keys]
+    position = None
+    if state:
+        try:
+            position = tuple(parse(v) for (_, parse), v in zip(keys, state['k']))
+            if len(position) != len(keys):
+                position = None
+        except (KeyError, TypeError, ValueError):
+            position = None
+    backwards = bool(position) and state.get('d') == 'prev'
+
+    def key(item):
+        return tuple(getattr(item, name) for name in names)
+
+    rows = sorted(rows, key=key, reverse=True)
+    total = len(rows)
+    if position and backwards:
+        rows = [r for r in rows if key(r) > position][-(per_page + 1):]
+        more = len(rows) > per_page
+        items = rows[-per_page:]
+    else:
+        if position:
+            rows = [r for r in rows if key(r) < position]
+        more = len(rows) > per_page
+        items = rows[:per_page]
+
+    def token(item, direction):
+        return encode_cursor({'f': filters, 'k': list(key(item)), 'd': direction, 't': total})
+
+    has_next = more if not backwards else True
+    has_prev = bool(position) if not backwards else more
+    return KeysetPage(
+        items,
+        filters,
+        next_cursor=token(items[-1], 'next') if items and has_next else None,
+        prev_cursor=token(items[0], 'prev') if items and has_prev else None,
+        total=total
+    )
 
 def safe_date(value):
     """Convert YYYY-MM-DD string to date object. Returns None if invalid."""